@@ -1,14 +1,13 @@
 import copy
+import os
 import sys
 
-import pandas as pd
 import streamlit as st
 from st_aggrid import AgGrid
 from streamlit import cli as stcli
 
 import app_helper as helper
 from app_helper import APP_THEME, GRID_SIZE
-from optimizer import data_handlers as dh
 from optimizer.data_structures import DISPLAY_STAT_LIST, SET_TYPES, STAT_LIST
 
 
@@ -17,10 +16,6 @@ def main():
     # alias for session_state since it's too long
     state = st.session_state
 
-    # create flag to determine whether data should be re-initialised - False on first run
-    if "data_initialised" not in state:
-        state["data_initialised"] = False
-
     helper.set_app_design_configs()
 
     ##############################
@@ -35,6 +30,7 @@ def main():
         st.stop()
 
     # generate derivative data with required outputs being stored in session_state
+    # (only rebuilt when a different gear file is loaded)
     helper.generate_derivative_input_data(state, gear_file)
 
     ########################
@@ -43,6 +39,13 @@ def main():
 
     st.sidebar.header("Options")
 
+    # summary of the last gear file re-import
+    if "item_diff" in state:
+        st.sidebar.caption(
+            "Gear file update: "
+            + ", ".join(f"{len(v)} {k}" for k, v in state.item_diff.items())
+        )
+
     ### Select at least one character before progressing
     selected_hero = st.sidebar.selectbox(
         "Select a hero", state.user_hero_name_list
@@ -108,6 +111,7 @@ def main():
             artifact_attack=artifact_attack,
             artifact_health=artifact_health,
         )
+        helper.bump_state_version(state)
 
     else:
         refresh_table_setting = False
@@ -141,6 +145,10 @@ def main():
                 If a hero's weighting is set to 0, besides meeting the hard constraints, the optimizer won't try to maximise stats 
                 in any other way. This allows you to both weigh stats against one another per hero, and then weigh heroes against one another 
                 on a separate basis. 
+
+                Rather than cranking up hero weights to stop one hero from taking everything, you can instead give heroes a priority tier 
+                and select tiered optimization. Tier 1 heroes are optimized first, their score is then locked in (within the selected 
+                tolerance) and tier 2 heroes are optimized with the remaining gear, and so on.
                 
                 You'll see the net weights given in the 'Weightings' table once you add the hero to the optimizer. You can interpret these 
                 values directly (e.g. a hero/stat combination with a weight of 50 is valued 10x greater than another with a weight of 5).
@@ -220,6 +228,14 @@ def main():
                     step=1,
                 )
 
+                hero_tier = st.slider(
+                    "Select hero priority tier (used with tiered optimization)",
+                    min_value=1,
+                    max_value=5,
+                    value=hero_state["hero_tier_form"],
+                    step=1,
+                )
+
             constraint_submit_cols = st.columns(4)
             constraint_submit = constraint_submit_cols[0].form_submit_button(
                 "Add Hero to Optimizer"
@@ -247,7 +263,11 @@ def main():
     if constraint_submit:
 
         helper.submit_constraints(
-            hero_state, constraints_response, set_type_selection, hero_weight
+            hero_state,
+            constraints_response,
+            set_type_selection,
+            hero_weight,
+            hero_tier,
         )
 
         helper.create_or_update_optimization_inputs(
@@ -266,44 +286,21 @@ def main():
     ######################################
 
     # Visualisation of collection dfs
+    # (tables are only rebuilt and reloaded when the constraints change)
+    constraint_tables = helper.get_render_model(
+        state, "constraint_tables", helper.build_constraint_render_model
+    )
     with st.expander("Constraint Lists", expanded=True):
 
-        st.markdown("#### Minimum Constraint Collection")
-        AgGrid(
-            state.minimum_constraints[DISPLAY_STAT_LIST].reset_index(),
-            fit_columns_on_grid_load=True,
-            reload_data=True,
-            height=GRID_SIZE * (1 + state.minimum_constraints.shape[0]),
-            theme=APP_THEME,
-            key="min_collection",
-        )
-        st.markdown("#### Maximum Constraint Collection")
-        AgGrid(
-            state.maximum_constraints[DISPLAY_STAT_LIST].reset_index(),
-            fit_columns_on_grid_load=True,
-            reload_data=True,
-            height=GRID_SIZE * (1 + state.maximum_constraints.shape[0]),
-            theme=APP_THEME,
-            key="max_collection",
-        )
-        st.markdown("#### Weightings")
-        AgGrid(
-            state.stat_weightings[DISPLAY_STAT_LIST].reset_index(),
-            fit_columns_on_grid_load=True,
-            reload_data=True,
-            height=GRID_SIZE * (1 + state.stat_weightings.shape[0]),
-            theme=APP_THEME,
-            key="weight_collection",
-        )
-        st.markdown("#### Set Type Constraint Collection")
-        AgGrid(
-            state.set_type_constraints.reset_index(),
-            fit_columns_on_grid_load=True,
-            reload_data=True,
-            height=GRID_SIZE * (1 + state.set_type_constraints.shape[0]),
-            theme=APP_THEME,
-            key="set_collection",
-        )
+        for title, key, table in constraint_tables:
+            st.markdown(f"#### {title}")
+            AgGrid(
+                table,
+                fit_columns_on_grid_load=True,
+                height=GRID_SIZE * (1 + table.shape[0]),
+                theme=APP_THEME,
+                key=f"{key}_{state.state_version}",
+            )
 
     ####################################
     ### OPTIMIZATION SOLVER SETTINGS ###
@@ -319,22 +316,152 @@ def main():
             max_value=1000,
             value=60,
         )
+        # up to the number of cores of the machine running the app
+        cpu_count = os.cpu_count() or 1
         worker_count = col_2_opt.slider(
             "Select number of workers",
             min_value=1,
+            max_value=max(cpu_count, 2),
+            value=min(8, cpu_count),
+            step=1,
+        )
+
+        use_tiers = col_1_opt.checkbox(
+            "Optimize heroes tier by tier (solver time is split between tiers)"
+        )
+        tier_tolerance = col_2_opt.number_input(
+            "Allowed relative objective loss for higher tiers",
+            min_value=0.0,
+            max_value=1.0,
+            value=0.0,
+            step=0.01,
+        )
+
+        # gear locking options
+        keep_gear_heroes = col_1_opt.multiselect(
+            "Keep current gear on",
+            options=list(state.minimum_constraints.index),
+        )
+        excluded_owner_heroes = col_2_opt.multiselect(
+            "Never take gear from",
+            options=state.user_hero_name_list,
+        )
+        scope_to_selected = col_1_opt.checkbox(
+            "Only use gear that is unequipped or worn by the heroes in the optimizer"
+        )
+        col_2_opt.caption(
+            f"{len(state.pinned_items)} items locked onto heroes from previous runs"
+        )
+
+        max_objective_coefficient = col_1_opt.number_input(
+            "Rescale objective coefficients to at most (0 = exact objective)",
+            min_value=0,
+            max_value=1000000,
+            value=0,
+            step=100,
+        )
+        coarse_to_fine = col_2_opt.checkbox(
+            "Solve a coarse model first (faster for large groups of heroes, not used with tiers)"
+        )
+        n_solutions = col_2_opt.number_input(
+            "Number of distinct solutions to find (solver time is split between them, not used with tiers)",
+            min_value=1,
             max_value=10,
-            value=8,
+            value=1,
             step=1,
         )
+        resume_with_cutoff = col_2_opt.checkbox(
+            "When resuming from a checkpoint, only search for better solutions"
+        )
+        two_phase = col_2_opt.checkbox(
+            "Find any solution meeting the constraints first (for tight constraints, not used with tiers)"
+        )
+        cluster_size = col_1_opt.number_input(
+            "Split heroes into clusters of at most (0 = single model, for whole rosters, not used with tiers)",
+            min_value=0,
+            max_value=100,
+            value=0,
+            step=1,
+        )
+        relative_gap = col_1_opt.number_input(
+            "Stop within this % of the best possible objective (0 = off)",
+            min_value=0.0,
+            max_value=100.0,
+            value=0.0,
+            step=0.1,
+        )
+        absolute_gap = col_2_opt.number_input(
+            "Stop within this objective value of the best possible objective (0 = off)",
+            min_value=0,
+            max_value=1000000,
+            value=0,
+            step=100,
+        )
+        stall_time = col_1_opt.number_input(
+            "Stop after this many seconds without a better solution (0 = off)",
+            min_value=0,
+            max_value=3600,
+            value=0,
+            step=5,
+        )
 
         optimizer_button = st.form_submit_button("Optimize")
 
     if optimizer_button:
         with st.spinner("Optimizing..."):
 
-            helper.run_optimizer(state, solver_time, worker_count)
+            helper.run_optimizer(
+                state,
+                solver_time,
+                worker_count,
+                use_tiers=use_tiers,
+                tier_tolerance=tier_tolerance,
+                keep_gear_heroes=keep_gear_heroes,
+                excluded_owner_heroes=excluded_owner_heroes,
+                scope_to_selected=scope_to_selected,
+                status_placeholder=st.empty(),
+                max_objective_coefficient=max_objective_coefficient or None,
+                coarse_to_fine=coarse_to_fine,
+                cluster_size=cluster_size or None,
+                n_solutions=n_solutions,
+                resume_with_cutoff=resume_with_cutoff,
+                relative_gap=relative_gap / 100 or None,
+                absolute_gap=absolute_gap or None,
+                stall_time=stall_time or None,
+                two_phase=two_phase,
+            )
             st.info(state.response_dict["message"])
 
+            if "tier_table" in state.response_dict:
+                st.write(state.response_dict["tier_table"])
+
+            if "cluster_table" in state.response_dict:
+                with st.expander("Decomposition Report"):
+                    st.write(state.response_dict["cluster_table"])
+                    st.write(state.response_dict["exchange_table"])
+
+            if "alternatives_table" in state.response_dict:
+                with st.expander("Alternative Solutions"):
+                    st.write(state.response_dict["alternatives_table"])
+                    for solution_ix, alternative in enumerate(
+                        state.response_dict["alternatives"]
+                    ):
+                        st.caption(
+                            f"Solution {solution_ix + 2} ({alternative['gap']:.2%} below the best objective)"
+                        )
+                        st.write(alternative["stats_table"][DISPLAY_STAT_LIST])
+
+            if "stage_table" in state.response_dict:
+                st.write(state.response_dict["stage_table"])
+
+            if "conflict_table" in state.response_dict:
+                st.write(state.response_dict["conflict_table"])
+
+            if "objective_summary" in state.response_dict:
+                with st.expander("Effective Objective"):
+                    st.write(state.response_dict["objective_summary"])
+                    st.write(state.response_dict["objective_table"])
+
     # don't progress if optimization is unsuccessful or hasn't been run
     if "response_dict" not in state:
         st.stop()
@@ -346,49 +473,13 @@ def main():
     if state.response_dict["status"] not in ["OPTIMAL", "FEASIBLE"]:
         st.stop()
 
-    # equip gear to optimization heroes
-    state.optimized_selected_hero_list = list(
-        state.response_dict["stats_table"].index
-    )
-    state.optimized_selected_hero_objects = [
-        state["hero_info"][hero]["optimized"]
-        for hero in state.optimized_selected_hero_list
-    ]
-
-    # get equip lists
-    optimized_equip_lists = dh.get_equip_lists_from_equip_dict(
-        selected_hero_list=state.optimized_selected_hero_list,
-        equip_dict=state.response_dict["equip_dict"],
+    # equip gear to optimization heroes and build the result tables (once per solve)
+    result_tables = helper.get_render_model(
+        state, "result_tables", helper.build_result_render_model
     )
-
-    helper.equip_items_to_heroes(
-        state.optimized_selected_hero_list,
-        state.optimized_selected_hero_objects,
-        state.optimized_item_objects,
-        optimized_equip_lists,
-    )
-
-    # create joined dataframes of stats for heroes both before and after optimization
-    initial_output_df = pd.concat(
-        [
-            state["hero_info"][hero]["initial"].dataframe_repr().T.reset_index()
-            for hero in state.optimized_selected_hero_list
-        ]
-    )
-    optimized_output_df = pd.concat(
-        [
-            state["hero_info"][hero]["optimized"]
-            .dataframe_repr()
-            .T.reset_index()
-            for hero in state.optimized_selected_hero_list
-        ]
-    )
-    equipment_df_dict = {
-        hero: pd.DataFrame(
-            state["hero_info"][hero]["optimized"].get_equipment_list()
-        )
-        for hero in state.optimized_selected_hero_list
-    }
+    initial_output_df = result_tables["initial_output_df"]
+    optimized_output_df = result_tables["optimized_output_df"]
+    equipment_df_dict = result_tables["equipment_df_dict"]
 
     ################################
     ### OPTIMIZATION RESULTS VIZ ###
@@ -396,29 +487,39 @@ def main():
 
     st.subheader("Initial Stats")
     AgGrid(
-        initial_output_df[["index"] + DISPLAY_STAT_LIST + ["Active_Sets"]],
+        initial_output_df,
         fit_columns_on_grid_load=True,
         height=GRID_SIZE * (1 + initial_output_df.shape[0]),
         theme=APP_THEME,
+        key=f"initial_stats_{state.state_version}",
     )
 
     st.subheader("Optimized Stats")
     AgGrid(
-        optimized_output_df[["index"] + DISPLAY_STAT_LIST + ["Active_Sets"]],
+        optimized_output_df,
         fit_columns_on_grid_load=True,
         height=GRID_SIZE * (1 + optimized_output_df.shape[0]),
         theme=APP_THEME,
+        key=f"optimized_stats_{state.state_version}",
     )
 
     # show all equipment in a table and include a save button to store output locally
-    equipment_csv = helper.get_equipment_csv(equipment_df_dict)
     st.download_button(
         "Download equipment table as csv",
-        equipment_csv,
+        result_tables["equipment_csv"],
         file_name="optimized_equipment.csv",
         mime="text/csv",
     )
 
+    # lock the optimized gear so follow up runs with other heroes leave it alone
+    lock_cols = st.columns(4)
+    if lock_cols[0].button("Lock optimized gear onto heroes"):
+        helper.lock_equipment(state, result_tables["equip_lists"])
+        st.info(f"{len(state.pinned_items)} items locked")
+    if lock_cols[1].button("Clear gear locks"):
+        state.pinned_items = {}
+        st.info("Gear locks cleared")
+
     with st.expander("Equipment Details"):
         for hero, equip_items in equipment_df_dict.items():
             st.subheader(f"{hero} Equipment")
@@ -427,7 +528,7 @@ def main():
                 fit_columns_on_grid_load=True,
                 height=GRID_SIZE * (1 + equip_items.shape[0]),
                 theme=APP_THEME,
-                key=f"{hero}_equipment_table",
+                key=f"{hero}_equipment_table_{state.state_version}",
             )
 
 
@@ -1,18 +1,28 @@
 import copy
+import hashlib
 import json
+import os
+import shutil
+import time
 
 import pandas as pd
 import streamlit as st
 
 from optimizer import data_handlers as dh
+from optimizer.bounds import check_constraint_bounds
+from optimizer.cache import ResultCache, hash_optimizer_inputs
 from optimizer.data_structures import (
+    DISPLAY_STAT_LIST,
     MAX_VALUE,
     STAT_LIST,
     STAT_NORMALISATION_DICT,
     StatStick,
     StatStickMax,
 )
+from optimizer.decomposition import DecomposedOptimizer
 from optimizer.optimizer import Optimizer
+from optimizer.scheduler import SolveScheduler
+from optimizer.tuning import save_instance
 
 ##################
 ### APP CONFIG ###
@@ -21,6 +31,49 @@ from optimizer.optimizer import Optimizer
 APP_THEME = "streamlit"
 GRID_SIZE = 32  # extra pixel count per hero for generating AgGrid tables
 
+RESULT_CACHE_SIZE = 32  # number of optimizer results kept in memory
+# set to a directory (e.g. "./data/result_cache") to persist results
+RESULT_CACHE_DIR = None
+
+# set to a directory (e.g. "./data/checkpoints") to save the best solution during long solves,
+# runs on the same inputs then resume from it
+CHECKPOINT_DIR = None
+CHECKPOINT_INTERVAL = 10  # minimum seconds between checkpoint writes
+
+# set to a directory, relative to the project root the app is started from (e.g. "./data/tuning_corpus"),
+# to save the inputs of every run as an instance for tuning the solver parameters (see optimizer/tuning.py)
+TUNING_CORPUS_DIR = None
+
+# set to a directory, relative to the project root the app is started from (e.g. "./data/captures"),
+# to save the model of slow solves as a bundle, which can be re-solved offline
+# with `python -m optimizer.replay` (run from e7_optimizer/)
+CAPTURE_DIR = None
+CAPTURE_MIN_TIME = (
+    30  # solves that reach optimality faster than this aren't kept
+)
+
+# total solver workers shared by all sessions, None uses the number of cpu cores
+SOLVE_WORKER_BUDGET = None
+
+GEAR_FILE_CACHE_SIZE = 16  # number of parsed gear files shared between sessions
+GEAR_FILE_CACHE_TTL = (
+    24 * 60 * 60
+)  # seconds before a parsed gear file is dropped
+
+# session state derived from the gear file, cleared whenever a new gear file is loaded
+GEAR_FILE_STATE_KEYS = [
+    "hero_info",
+    "minimum_constraints",
+    "maximum_constraints",
+    "base_with_additional_stats",
+    "base_stats",
+    "set_type_constraints",
+    "stat_weightings",
+    "hero_tiers",
+    "response_dict",
+    "item_diff",
+]
+
 
 ###################
 ### APP HELPERS ###
@@ -40,88 +93,239 @@ def generate_derivative_input_data(state, gear_file):
     """Generates all the required derivative data from input if it does not already exist.
     Essentially all the set up after loading the gear file and before any further user interaction.
 
+    Derived data is cached by the content hash of the gear file, so re-uploading the same file is instant.
+    A newer export of the same account is applied as an item level patch (see reimport_derivative_data),
+    keeping constraints, locks and results. Anything else replaces the derived data (and anything built on top of it).
+
     Args:
         state ([type]): [description]
         gear_file ([type]): [description]
     """
 
-    if not state["data_initialised"]:
+    gear_file_bytes = gear_file.getvalue()
+    gear_file_hash = hashlib.sha256(gear_file_bytes).hexdigest()
 
-        # 'raw' data
-        hero_and_gear_data = json.load(gear_file)
+    if state.get("gear_file_hash") == gear_file_hash:
+        return
 
-        ##############
-        ### HEROES ###
-        ##############
+    if "user_item_data" not in state or not reimport_derivative_data(
+        state, json.loads(gear_file_bytes)
+    ):
 
-        all_heroes_base_df = dh.get_raw_hero_data()
+        # clear any state built on a previously loaded gear file
+        for key in GEAR_FILE_STATE_KEYS:
+            if key in state:
+                del state[key]
 
-        user_hero_data = dh.get_user_hero_data(hero_and_gear_data)
+        derivative_data = load_derivative_data(gear_file_hash, gear_file_bytes)
+        for key, value in derivative_data.items():
+            state[key] = value
 
-        # canonical list of user heroes stored in state
-        state.user_hero_name_list = [i["name"] for i in user_hero_data]
+        # {item id: hero name} for gear locked onto heroes between runs
+        state.pinned_items = {}
+
+    state["gear_file_hash"] = gear_file_hash
+    bump_state_version(state)
 
-        # creating baseline Hero objects for every user hero
-        state.initial_hero_objects = dh.generate_hero_objects_from_df(
-            all_heroes_base_df.loc[state.user_hero_name_list]
-        )
 
-        # copy created as they will be unequipped in the optimization process
-        # but we want to retain the 'original' equip state, perhaps
-        state.optimized_hero_objects = copy.deepcopy(state.initial_hero_objects)
+@st.experimental_memo(max_entries=GEAR_FILE_CACHE_SIZE, ttl=GEAR_FILE_CACHE_TTL)
+def load_derivative_data(gear_file_hash, _gear_file_bytes):
+    """Cached wrapper of build_derivative_data shared by all sessions.
+    Only the hash is used as the cache key, each call returns a fresh copy of the data.
+    """
 
-        #############
-        ### ITEMS ###
-        #############
+    return build_derivative_data(json.loads(_gear_file_bytes))
 
-        # item/gear data
-        user_item_data = dh.get_user_item_data(hero_and_gear_data)
-        state.initial_item_objects = dh.generate_item_objects_from_list(
-            user_item_data
-        )
 
-        # copy created as they will be unequipped in the optimization process
-        # but we want to retain the 'original' equip state, perhaps
-        state.optimized_item_objects = copy.deepcopy(state.initial_item_objects)
+def build_derivative_data(hero_and_gear_data):
+    """Parses the 'raw' gear file data into the hero objects, item objects and item_df.
 
-        # canonical item input for optimizer
-        state.item_df = dh.get_item_df(state.initial_item_objects)
+    Args:
+        hero_and_gear_data ([type]): 'raw' json user data on heroes and gear
 
-        ############
-        ### BOTH ###
-        ############
+    Returns:
+        Dict: derivative data to be stored in session state
+    """
 
-        # initial assignment of items to heroes based on gear file
-        initial_equip_dict = dh.generate_initial_equip_dict(
-            user_hero_data, user_item_data
-        )
+    derivative_data = {}
 
-        # conversion to make it easier to use
-        initial_equip_lists = dh.get_equip_lists_from_equip_dict(
-            state.user_hero_name_list, initial_equip_dict
-        )
+    ##############
+    ### HEROES ###
+    ##############
+
+    user_hero_data = dh.get_user_hero_data(hero_and_gear_data)
+
+    # canonical list of user heroes
+    derivative_data["user_hero_name_list"] = [i["name"] for i in user_hero_data]
+
+    # creating baseline Hero objects for every user hero
+    # base stats are loaded once per process (see data_handlers.get_hero_reference_data)
+    initial_hero_objects = dh.generate_hero_objects_from_df(
+        dh.get_hero_reference_data().loc[derivative_data["user_hero_name_list"]]
+    )
+
+    # copy created as they will be unequipped in the optimization process
+    # but we want to retain the 'original' equip state, perhaps
+    optimized_hero_objects = copy.deepcopy(initial_hero_objects)
+
+    #############
+    ### ITEMS ###
+    #############
+
+    # item/gear data
+    user_item_data = dh.get_user_item_data(hero_and_gear_data)
+    initial_item_objects = dh.generate_item_objects_from_list(user_item_data)
+
+    # copy created as they will be unequipped in the optimization process
+    # but we want to retain the 'original' equip state, perhaps
+    optimized_item_objects = copy.deepcopy(initial_item_objects)
+
+    # canonical item input for optimizer
+    item_df = dh.get_item_df(initial_item_objects)
+    item_df["equipped_by"] = dh.get_item_owners(hero_and_gear_data)
+
+    ############
+    ### BOTH ###
+    ############
+
+    # initial assignment of items to heroes based on gear file
+    initial_equip_dict = dh.generate_initial_equip_dict(
+        user_hero_data, user_item_data
+    )
+
+    # conversion to make it easier to use
+    initial_equip_lists = dh.get_equip_lists_from_equip_dict(
+        derivative_data["user_hero_name_list"], initial_equip_dict
+    )
+
+    # equip hero objects with item objects according to the initial assignments
+    equip_items_to_heroes(
+        derivative_data["user_hero_name_list"],
+        initial_hero_objects,
+        initial_item_objects,
+        initial_equip_lists,
+    )
+
+    # equip the optimized set as well -> this will be altered later
+    equip_items_to_heroes(
+        derivative_data["user_hero_name_list"],
+        optimized_hero_objects,
+        optimized_item_objects,
+        initial_equip_lists,
+    )
+
+    derivative_data["initial_hero_objects"] = initial_hero_objects
+    derivative_data["optimized_hero_objects"] = optimized_hero_objects
+    derivative_data["initial_item_objects"] = initial_item_objects
+    derivative_data["optimized_item_objects"] = optimized_item_objects
+    derivative_data["item_df"] = item_df
+
+    # raw item data kept to diff against later exports
+    derivative_data["user_item_data"] = {
+        item["id"]: item for item in user_item_data
+    }
 
-        # equip hero objects with item objects according to the initial assignments
-        equip_items_to_heroes(
-            state.user_hero_name_list,
+    return derivative_data
+
+
+def reimport_derivative_data(state, hero_and_gear_data):
+    """Patches the derivative data in state with the items that changed since the loaded gear file,
+    so applying a new export costs in proportion to what changed rather than a full rebuild.
+
+    Added, removed and modified items (matched on the item id) are swapped in and out of the
+    item objects and item_df, and items that changed hands are re-equipped.
+    Locks and the latest result are kept for the items that still exist.
+
+    Args:
+        state ([type]): [description]
+        hero_and_gear_data ([type]): 'raw' json user data on heroes and gear
+
+    Returns:
+        bool: False if the user heroes differ and the data needs to be rebuilt instead
+    """
+
+    user_hero_data = dh.get_user_hero_data(hero_and_gear_data)
+    if [i["name"] for i in user_hero_data] != state.user_hero_name_list:
+        return False
+
+    new_item_data = {
+        item["id"]: item for item in dh.get_user_item_data(hero_and_gear_data)
+    }
+    item_diff = dh.diff_user_item_data(state.user_item_data, new_item_data)
+
+    dropped_items = item_diff["removed"] + item_diff["modified"]
+    new_items = item_diff["added"] + item_diff["modified"]
+
+    initial_new_item_objects = dh.generate_item_objects_from_list(
+        [new_item_data[i] for i in new_items]
+    )
+    optimized_new_item_objects = copy.deepcopy(initial_new_item_objects)
+
+    hero_index = {hero["id"]: ix for ix, hero in enumerate(user_hero_data)}
+
+    for hero_objects, item_objects, new_item_objects in [
+        (
             state.initial_hero_objects,
             state.initial_item_objects,
-            initial_equip_lists,
-        )
-
-        # equip the optimized set as well -> this will be altered later
-        equip_items_to_heroes(
-            state.user_hero_name_list,
+            initial_new_item_objects,
+        ),
+        (
             state.optimized_hero_objects,
             state.optimized_item_objects,
-            initial_equip_lists,
-        )
+            optimized_new_item_objects,
+        ),
+    ]:
+
+        # take removed and outdated items off their heroes
+        for item_id in dropped_items:
+            item = item_objects.pop(item_id)
+            if item.equipped_to:
+                item.equipped_to.unequip_item(item)
+
+        item_objects.update(new_item_objects)
+
+        # (re-)equip anything that is new or changed hands as per the new gear file
+        for item_id in new_items + item_diff["owner_changed"]:
+            item = item_objects[item_id]
+            owner = new_item_data[item_id]["ingameEquippedId"]
+            owner_ix = (
+                None if owner == "undefined" else hero_index.get(int(owner))
+            )
+
+            if owner_ix is not None:
+                hero_objects[owner_ix].equip_item(item)
+            elif item.equipped_to:
+                item.equipped_to.unequip_item(item)
+
+    state.item_df = dh.patch_item_df(
+        state.item_df,
+        initial_new_item_objects,
+        dh.get_item_owners(hero_and_gear_data),
+        list(new_item_data.keys()),
+        dropped_items=dropped_items,
+        owner_changed_items=item_diff["owner_changed"],
+    )
+    state.user_item_data = new_item_data
 
-        # set flag to indicate that session is initialised
-        state["data_initialised"] = True
+    # locks and previous results stay valid for the items that still exist
+    removed_items = set(item_diff["removed"])
+    state.pinned_items = {
+        item: hero
+        for item, hero in state.get("pinned_items", {}).items()
+        if item not in removed_items
+    }
+    if "equip_dict" in state.get("response_dict", {}):
+        state.response_dict["equip_dict"] = {
+            hero_item: equip_state
+            for hero_item, equip_state in state.response_dict[
+                "equip_dict"
+            ].items()
+            if hero_item[1] not in removed_items
+        }
 
-    else:
-        pass
+    state.item_diff = item_diff
+
+    return True
 
 
 def equip_items_to_heroes(hero_list, hero_objects, item_objects, equip_list):
@@ -167,6 +371,7 @@ def initialise_selected_hero_state(state, selected_hero):
         hero_state["stat_weightings_form"] = 1
         hero_state["set_selection_form"] = None
         hero_state["hero_weighting_form"] = 5
+        hero_state["hero_tier_form"] = 1
     else:
 
         hero_state = state["hero_info"][selected_hero]
@@ -225,6 +430,9 @@ def drop_current_hero(state, current_hero):
         state.base_stats.drop(index=current_hero, inplace=True)
         state.set_type_constraints.drop(index=current_hero, inplace=True)
         state.stat_weightings.drop(index=current_hero, inplace=True)
+        state.hero_tiers.drop(index=current_hero, inplace=True)
+
+        bump_state_version(state)
 
         return 0
 
@@ -233,7 +441,7 @@ def drop_current_hero(state, current_hero):
 
 
 def submit_constraints(
-    hero_state, constraints_response, set_type_selection, hero_weight
+    hero_state, constraints_response, set_type_selection, hero_weight, hero_tier
 ):
 
     # set form input states to submitted values
@@ -248,6 +456,7 @@ def submit_constraints(
     ].values
     hero_state["set_selection_form"] = list(set_type_selection)
     hero_state["hero_weighting_form"] = hero_weight
+    hero_state["hero_tier_form"] = hero_tier
 
 
 def create_or_update_optimization_inputs(
@@ -304,6 +513,13 @@ def create_or_update_optimization_inputs(
         index=[hero_state["name"]],
     )
 
+    # convert hero tier to dataframe
+    hero_tier_df = pd.DataFrame(
+        [[hero_state["hero_tier_form"]]],
+        columns=["hero_tier"],
+        index=[hero_state["name"]],
+    )
+
     base_with_additional_stats_df = pd.DataFrame(
         hero_state["optimized"].base_with_additional_stats.__dict__,
         index=[hero_state["name"]],
@@ -314,6 +530,15 @@ def create_or_update_optimization_inputs(
         index=[hero_state["name"]],
     )
 
+    # converted to the integer tables the optimizer uses once here, rather than on every run
+    min_df = dh.to_int_table(min_df)
+    max_df = dh.to_int_table(max_df)
+    stat_weight_df = dh.to_int_table(stat_weight_df)
+    base_with_additional_stats_df = dh.to_int_table(
+        base_with_additional_stats_df
+    )
+    base_stats_df = dh.to_int_table(base_stats_df)
+
     # create new state if collection dfs don't exist
     if not "minimum_constraints" in state:
         state.minimum_constraints = min_df
@@ -322,6 +547,7 @@ def create_or_update_optimization_inputs(
         state.base_stats = base_stats_df
         state.set_type_constraints = set_type_df
         state.stat_weightings = stat_weight_df
+        state.hero_tiers = hero_tier_df
     else:
 
         # add or update collection dfs for optimizer
@@ -342,6 +568,9 @@ def create_or_update_optimization_inputs(
         state.stat_weightings = edit_or_append_df(
             state.stat_weightings, stat_weight_df
         )
+        state.hero_tiers = edit_or_append_df(state.hero_tiers, hero_tier_df)
+
+    bump_state_version(state)
 
 
 def edit_or_append_df(
@@ -365,24 +594,465 @@ def edit_or_append_df(
 def get_equipment_csv(equipment_df_dict):
 
     # add the hero name as a column in each dataframe
+    # (on copies, the tables are reused by the result render model)
+    equipment_dfs = []
     for k, v in equipment_df_dict.items():
+        v = v.copy()
         v.insert(0, "Hero", k)
+        equipment_dfs.append(v)
 
     # combine into single dataframe as a csv
-    return pd.concat(list(equipment_df_dict.values())).to_csv().encode("utf-8")
+    return pd.concat(equipment_dfs).to_csv().encode("utf-8")
+
+
+def bump_state_version(state):
+    """Marks the optimizer inputs or results as changed, so the render models get rebuilt"""
+
+    state["state_version"] = state.get("state_version", 0) + 1
+
 
+def get_render_model(state, name, build_render_model):
+    """Returns the tables to display for part of the app, only rebuilding them
+    when the state version changed (i.e. after a solve or constraint edit)
+    so idle reruns from widget interactions stay cheap.
 
-def run_optimizer(state, solver_time, worker_count):
-    opt = Optimizer(
-        item_df=state.item_df,
+    Args:
+        state ([type]): [description]
+        name (str): name of the render model
+        build_render_model (Callable): builds the render model from state
+
+    Returns:
+        Dict: render model
+    """
+
+    if "render_models" not in state:
+        state["render_models"] = {}
+
+    version = state.get("state_version", 0)
+    cached = state["render_models"].get(name)
+
+    if cached is None or cached["version"] != version:
+        cached = {"version": version, "model": build_render_model(state)}
+        state["render_models"][name] = cached
+
+    return cached["model"]
+
+
+def build_constraint_render_model(state):
+    """Tables shown in the Constraint Lists section as [(title, key, df)]"""
+
+    return [
+        (
+            "Minimum Constraint Collection",
+            "min_collection",
+            state.minimum_constraints[DISPLAY_STAT_LIST].reset_index(),
+        ),
+        (
+            "Maximum Constraint Collection",
+            "max_collection",
+            state.maximum_constraints[DISPLAY_STAT_LIST].reset_index(),
+        ),
+        (
+            "Weightings",
+            "weight_collection",
+            state.stat_weightings[DISPLAY_STAT_LIST].reset_index(),
+        ),
+        (
+            "Set Type Constraint Collection",
+            "set_collection",
+            state.set_type_constraints.reset_index(),
+        ),
+        (
+            "Hero Priority Tiers",
+            "tier_collection",
+            state.hero_tiers.reset_index(),
+        ),
+    ]
+
+
+def build_result_render_model(state):
+    """Equips the optimized gear onto the optimization heroes and builds the result tables.
+    Done once per solve rather than on every rerun.
+
+    Returns:
+        Dict: equip lists, stat tables before/after optimization and equipment tables
+    """
+
+    selected_hero_list = list(state.response_dict["stats_table"].index)
+
+    # get equip lists
+    equip_lists = dh.get_equip_lists_from_equip_dict(
+        selected_hero_list=selected_hero_list,
+        equip_dict=state.response_dict["equip_dict"],
+    )
+
+    # equip gear to optimization heroes
+    equip_items_to_heroes(
+        selected_hero_list,
+        [state["hero_info"][hero]["optimized"] for hero in selected_hero_list],
+        state.optimized_item_objects,
+        equip_lists,
+    )
+
+    # create joined dataframes of stats for heroes both before and after optimization
+    initial_output_df = pd.concat(
+        [
+            state["hero_info"][hero]["initial"].dataframe_repr().T.reset_index()
+            for hero in selected_hero_list
+        ]
+    )
+    optimized_output_df = pd.concat(
+        [
+            state["hero_info"][hero]["optimized"]
+            .dataframe_repr()
+            .T.reset_index()
+            for hero in selected_hero_list
+        ]
+    )
+    equipment_df_dict = {
+        hero: pd.DataFrame(
+            state["hero_info"][hero]["optimized"].get_equipment_list()
+        )
+        for hero in selected_hero_list
+    }
+
+    return {
+        "equip_lists": equip_lists,
+        "initial_output_df": initial_output_df[
+            ["index"] + DISPLAY_STAT_LIST + ["Active_Sets"]
+        ],
+        "optimized_output_df": optimized_output_df[
+            ["index"] + DISPLAY_STAT_LIST + ["Active_Sets"]
+        ],
+        "equipment_df_dict": equipment_df_dict,
+        "equipment_csv": get_equipment_csv(equipment_df_dict),
+    }
+
+
+def lock_equipment(state, equip_lists):
+    """Locks the given {hero: [item ids]} onto their heroes for subsequent runs.
+    Any previous locks for those heroes are replaced.
+    """
+
+    state.pinned_items = {
+        item: hero
+        for item, hero in state.pinned_items.items()
+        if hero not in equip_lists
+    }
+
+    for hero, items in equip_lists.items():
+        for item in items:
+            state.pinned_items[item] = hero
+
+
+def get_item_scope(
+    state, keep_gear_heroes, excluded_owner_heroes, scope_to_selected
+):
+    """Determines the free and pinned items for the current optimizer heroes
+    based on gear locks and the gear locking options.
+    """
+
+    equipped_by = state.item_df["equipped_by"]
+
+    # current gear of 'keep gear' heroes replaces their saved locks,
+    # so no hero ends up with two items pinned in the same slot
+    pinned_items = {
+        **{
+            item: hero
+            for item, hero in state.pinned_items.items()
+            if hero not in keep_gear_heroes
+        },
+        **equipped_by[equipped_by.isin(keep_gear_heroes)].to_dict(),
+    }
+    excluded_items = equipped_by.index[
+        equipped_by.isin(excluded_owner_heroes)
+    ].difference(list(pinned_items.keys()))
+
+    return dh.get_optimizer_item_scope(
+        state.item_df,
+        selected_hero_list=list(state.minimum_constraints.index),
+        pinned_items=pinned_items,
+        excluded_items=excluded_items,
+        unequipped_or_selected_only=scope_to_selected,
+    )
+
+
+def run_optimizer(
+    state,
+    solver_time,
+    worker_count,
+    use_tiers=False,
+    tier_tolerance=0.0,
+    keep_gear_heroes=(),
+    excluded_owner_heroes=(),
+    scope_to_selected=False,
+    status_placeholder=None,
+    max_objective_coefficient=None,
+    coarse_to_fine=False,
+    cluster_size=None,
+    n_solutions=1,
+    resume_with_cutoff=False,
+    relative_gap=None,
+    absolute_gap=None,
+    stall_time=None,
+    two_phase=False,
+):
+
+    # any response (including rejected or cached ones) replaces the shown results
+    bump_state_version(state)
+
+    free_item_df, pinned_item_df = get_item_scope(
+        state, keep_gear_heroes, excluded_owner_heroes, scope_to_selected
+    )
+
+    # large groups of heroes are split into clusters (see optimizer.decomposition)
+    decompose = (
+        bool(cluster_size)
+        and not use_tiers
+        and len(state.base_stats) > cluster_size
+    )
+
+    # reject constraints that can't be reached before building/solving the model
+    conflict_table = check_constraint_bounds(
+        item_df=pd.concat([free_item_df, pinned_item_df]),
         hero_base_df=state.base_stats,
         hero_additional_df=state.base_with_additional_stats,
-    )
-    opt.add_constraints(
         hero_min_df=state.minimum_constraints,
         hero_max_df=state.maximum_constraints,
         set_constraints_df=state.set_type_constraints,
     )
-    opt.set_objective_optimisation(stat_weightings_df=state.stat_weightings)
-    opt.define_solver(timer=solver_time, worker_count=worker_count)
-    state["response_dict"] = opt.run_solver()
+
+    if not conflict_table.empty:
+        state["response_dict"] = {
+            "status": "INFEASIBLE",
+            "message": "Some constraints can't be reached with the available gear. Please relax the constraints below.",
+            "stats_table": None,
+            "equip_dict": None,
+            "conflict_table": conflict_table,
+        }
+        return
+
+    # identical inputs give identical results, so check for a previous run first
+    result_cache = get_result_cache()
+    cache_key = hash_optimizer_inputs(
+        free_item_df,
+        pinned_item_df,
+        state.base_stats,
+        state.base_with_additional_stats,
+        state.minimum_constraints,
+        state.maximum_constraints,
+        state.set_type_constraints,
+        state.stat_weightings,
+        state.hero_tiers if use_tiers else pd.DataFrame(),
+        use_tiers=use_tiers,
+        tier_tolerance=tier_tolerance if use_tiers else None,
+        max_objective_coefficient=max_objective_coefficient,
+        coarse_to_fine=coarse_to_fine and not use_tiers and not decompose,
+        cluster_size=cluster_size if decompose else None,
+        n_solutions=n_solutions if not (use_tiers or decompose) else 1,
+        two_phase=two_phase and not use_tiers and not decompose,
+        early_stopping=(relative_gap, absolute_gap, stall_time)
+        if not decompose
+        else None,
+    )
+    cached_result = result_cache.get(cache_key)
+
+    # optimal and (proven) infeasible results are final,
+    # feasible ones are only reused if not given more time
+    if cached_result is not None:
+        cached_status = cached_result["response_dict"]["status"]
+        if (cached_status in ["OPTIMAL", "INFEASIBLE"]) or (
+            cached_status == "FEASIBLE"
+            and cached_result["solver_time"] >= solver_time
+        ):
+            state["response_dict"] = {
+                **cached_result["response_dict"],
+                "message": cached_result["response_dict"]["message"]
+                + " (cached result)",
+            }
+            return
+
+    if decompose:
+        opt = DecomposedOptimizer(
+            item_df=free_item_df,
+            hero_base_df=state.base_stats,
+            hero_additional_df=state.base_with_additional_stats,
+            hero_min_df=state.minimum_constraints,
+            hero_max_df=state.maximum_constraints,
+            set_constraints_df=state.set_type_constraints,
+            stat_weightings_df=state.stat_weightings,
+            pinned_item_df=pinned_item_df,
+            cluster_size=cluster_size,
+        )
+    else:
+        opt = Optimizer(
+            item_df=free_item_df,
+            hero_base_df=state.base_stats,
+            hero_additional_df=state.base_with_additional_stats,
+            pinned_item_df=pinned_item_df,
+        )
+        opt.add_constraints(
+            hero_min_df=state.minimum_constraints,
+            hero_max_df=state.maximum_constraints,
+            set_constraints_df=state.set_type_constraints,
+        )
+        opt.set_objective_optimisation(
+            stat_weightings_df=state.stat_weightings,
+            max_objective_coefficient=max_objective_coefficient,
+        )
+
+    if TUNING_CORPUS_DIR:
+        save_instance(
+            os.path.join(TUNING_CORPUS_DIR, f"{cache_key}.pkl"),
+            item_df=free_item_df,
+            hero_base_df=state.base_stats,
+            hero_additional_df=state.base_with_additional_stats,
+            pinned_item_df=pinned_item_df,
+            hero_min_df=state.minimum_constraints,
+            hero_max_df=state.maximum_constraints,
+            set_constraints_df=state.set_type_constraints,
+            stat_weightings_df=state.stat_weightings,
+        )
+
+    def show_queue_position(position):
+        if status_placeholder is not None:
+            status_placeholder.info(
+                f"Waiting for other optimizations to finish (position {position} in queue)"
+            )
+
+    checkpoint = None
+
+    # solves from all sessions share the cpu, so wait for a slot before starting
+    with get_solve_scheduler().reserve(
+        worker_count, on_wait=show_queue_position
+    ) as allocated_workers:
+
+        if status_placeholder is not None:
+            status_placeholder.empty()
+
+        if decompose:
+            # the clusters share the workers between them
+            state["response_dict"] = opt.run_solver(
+                timer=solver_time, worker_count=allocated_workers
+            )
+        else:
+            opt.define_solver(timer=solver_time, worker_count=allocated_workers)
+            opt.set_early_stopping(
+                relative_gap=relative_gap,
+                absolute_gap=absolute_gap,
+                stall_time=stall_time,
+            )
+
+            # continue from a cached sub-optimal result when given more time
+            if (
+                cached_result is not None
+                and cached_result["response_dict"]["equip_dict"]
+            ):
+                opt.set_solution_hint(
+                    cached_result["response_dict"]["equip_dict"]
+                )
+
+            # or from the checkpoint of an unfinished run on the same inputs
+            if CHECKPOINT_DIR:
+                checkpoint = opt.enable_checkpointing(
+                    os.path.join(CHECKPOINT_DIR, f"{cache_key}.pkl"),
+                    interval=CHECKPOINT_INTERVAL,
+                    use_cutoff=resume_with_cutoff,
+                )
+
+            # captured before solving, so runs that never finish are kept as well
+            if CAPTURE_DIR:
+                opt.capture_model(
+                    os.path.join(CAPTURE_DIR, cache_key),
+                    use_tiers=use_tiers,
+                    coarse_to_fine=coarse_to_fine,
+                    n_solutions=n_solutions,
+                )
+            start_time = time.time()
+
+            if use_tiers:
+                state["response_dict"] = opt.run_tiered_solver(
+                    hero_tiers_df=state.hero_tiers, tolerance=tier_tolerance
+                )
+            else:
+                state["response_dict"] = opt.run_solver(
+                    coarse_to_fine=coarse_to_fine,
+                    n_solutions=n_solutions,
+                    two_phase=two_phase,
+                )
+
+            if (
+                CAPTURE_DIR
+                and state["response_dict"]["status"] == "OPTIMAL"
+                and time.time() - start_time < CAPTURE_MIN_TIME
+            ):
+                shutil.rmtree(
+                    os.path.join(CAPTURE_DIR, cache_key), ignore_errors=True
+                )
+
+    cache_result(
+        result_cache,
+        cache_key,
+        cached_result,
+        state["response_dict"],
+        solver_time,
+    )
+
+    if allocated_workers < worker_count:
+        state["response_dict"] = {
+            **state["response_dict"],
+            "message": state["response_dict"]["message"]
+            + f" (ran with {allocated_workers} of {worker_count} workers due to server load)",
+        }
+
+    if checkpoint is not None:
+        state["response_dict"] = {
+            **state["response_dict"],
+            "message": state["response_dict"]["message"]
+            + f" (resumed from a checkpoint with objective {checkpoint['objective_value']})",
+        }
+
+    # an optimal result is final and cached, so its checkpoint is no longer needed
+    if CHECKPOINT_DIR and state["response_dict"]["status"] == "OPTIMAL":
+        checkpoint_path = os.path.join(CHECKPOINT_DIR, f"{cache_key}.pkl")
+        if os.path.isfile(checkpoint_path):
+            os.remove(checkpoint_path)
+
+
+@st.experimental_singleton
+def get_solve_scheduler():
+    """Solve scheduler shared by all sessions"""
+
+    return SolveScheduler(worker_budget=SOLVE_WORKER_BUDGET)
+
+
+@st.experimental_singleton
+def get_result_cache():
+    """Result cache shared by all sessions"""
+
+    return ResultCache(
+        max_entries=RESULT_CACHE_SIZE, cache_dir=RESULT_CACHE_DIR
+    )
+
+
+def cache_result(
+    result_cache, cache_key, cached_result, response_dict, solver_time
+):
+    """Caches a response unless it's inconclusive or worse than what's already cached.
+    INFEASIBLE is only ever reported when proven, so it's as final as OPTIMAL.
+    """
+
+    if response_dict["status"] not in ["OPTIMAL", "FEASIBLE", "INFEASIBLE"]:
+        return
+
+    # a longer run from a cached solution should improve on it, but it isn't guaranteed
+    if (
+        cached_result is not None
+        and response_dict["status"] == "FEASIBLE"
+        and cached_result["response_dict"]["status"] == "FEASIBLE"
+        and response_dict["objective_value"]
+        < cached_result["response_dict"]["objective_value"]
+    ):
+        return
+
+    result_cache.put(cache_key, response_dict, solver_time)
@@ -0,0 +1 @@
+# the app and its tests import the optimizer package from this directory
@@ -0,0 +1,311 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from ortools.sat.python import cp_model
+
+from optimizer.data_structures import (
+    SET_TYPE_STATS,
+    STAT_LIST,
+    ItemTypes,
+    SetTypes,
+)
+from optimizer.optimizer import Optimizer
+
+
+class _SwapEvaluator:
+    """Evaluates the objective of every hero for every single item swap around a solution.
+
+    Uses the same integer stat arithmetic as the optimizer model (class_stat_values,
+    set_bonus_values), so objective changes are in the units of response_dict["objective_value"].
+    """
+
+    def __init__(self, opt: Optimizer, equip_dict: Dict):
+        self.opt = opt
+        self.heroes = list(opt.hero_iterator)
+        self.slot_types = list(ItemTypes)
+
+        hero_min_df, hero_max_df, set_constraints_df = opt.constraint_inputs
+        self.stat_min = hero_min_df[STAT_LIST].to_numpy(dtype=np.int64)
+        self.stat_max = hero_max_df[STAT_LIST].to_numpy(dtype=np.int64)
+
+        # set counts are tracked for all set types, bonuses only exist for some of them
+        self.set_types = list(SET_TYPE_STATS)
+        self.thresholds = np.array(
+            [
+                SET_TYPE_STATS[set_type]["threshold"]
+                for set_type in self.set_types
+            ]
+        )
+        self.bonus = np.zeros(
+            (len(self.heroes), len(self.set_types), len(STAT_LIST)),
+            dtype=np.int64,
+        )
+        for set_ix, set_type in enumerate(self.set_types):
+            if set_type in opt.set_bonus_values:
+                self.bonus[:, set_ix] = opt.set_bonus_values[set_type]
+
+        self.required_sets = []
+        for hero in self.heroes:
+            set_list = set_constraints_df.iloc[hero][0]
+            if not isinstance(set_list, (list, tuple)):
+                set_list = []
+            self.required_sets.append(
+                [self.set_types.index(set_type) for set_type in set_list]
+            )
+
+        # set and slot index of each class
+        self.class_set_ix = np.array(
+            [self.set_types.index(set_type) for set_type in opt.class_set_types]
+        )
+        self.class_slots = np.array(
+            [
+                self.slot_types.index(item_type)
+                for item_type in opt.class_df["item_type"]
+            ]
+        )
+
+        # current class in each slot of each hero (-1 if empty)
+        item_classes = dict(zip(opt.item_df.index, opt.item_class_ids))
+        self.current = np.full((len(self.heroes), len(self.slot_types)), -1)
+        for (hero, item), equipped in equip_dict.items():
+            if equipped and item in item_classes:
+                item_class = item_classes[item]
+                self.current[hero, self.class_slots[item_class]] = item_class
+
+        # stats without set bonuses, set counts (including pinned items)
+        self.flat_stats = opt.hero_stat_constants.copy()
+        self.set_counts = np.array(
+            [
+                [
+                    opt.pinned_set_counts[hero][set_type]
+                    for set_type in self.set_types
+                ]
+                for hero in self.heroes
+            ]
+        )
+        for hero in self.heroes:
+            for item_class in self.current[hero]:
+                if item_class >= 0:
+                    self.flat_stats[hero] += opt.class_stat_values[
+                        hero, item_class
+                    ]
+                    self.set_counts[hero, self.class_set_ix[item_class]] += 1
+
+        # objective of each hero in the solution
+        self.objective = np.array(
+            [
+                self._evaluate(
+                    hero, self.flat_stats[[hero]], self.set_counts[[hero]]
+                )[0][0]
+                for hero in self.heroes
+            ]
+        )
+
+    def _evaluate(self, hero, flat_stats, set_counts):
+        """objective and feasibility of builds of a hero, given their stats without set bonuses and set counts"""
+
+        active_sets = set_counts // self.thresholds
+        stats = flat_stats + active_sets @ self.bonus[hero]
+        objective = (stats * self.opt.stat_weights[hero]).sum(axis=1)
+
+        feasible = (stats >= self.stat_min[hero]).all(axis=1) & (
+            stats <= self.stat_max[hero]
+        ).all(axis=1)
+
+        return objective, feasible
+
+    def swap_in(self, hero, slot, classes):
+        """Objective change and feasibility of putting each of the classes into the slot of a hero.
+        A class of -1 empties the slot.
+        """
+
+        flat_stats = np.repeat(
+            self.flat_stats[hero][None], len(classes), axis=0
+        )
+        set_counts = np.repeat(
+            self.set_counts[hero][None], len(classes), axis=0
+        )
+
+        current_class = self.current[hero, slot]
+        if current_class >= 0:
+            flat_stats -= self.opt.class_stat_values[hero, current_class]
+            set_counts[:, self.class_set_ix[current_class]] -= 1
+
+        filled = classes >= 0
+        flat_stats[filled] += self.opt.class_stat_values[hero, classes[filled]]
+        set_counts[
+            np.flatnonzero(filled), self.class_set_ix[classes[filled]]
+        ] += 1
+
+        objective, feasible = self._evaluate(hero, flat_stats, set_counts)
+        for set_ix in self.required_sets[hero]:
+            feasible &= set_counts[:, set_ix] >= self.thresholds[set_ix]
+
+        return objective - self.objective[hero], feasible
+
+
+def get_marginal_item_values(
+    opt: Optimizer, response_dict: Dict, exact_top_n: int = 0, timer: int = 10
+) -> pd.DataFrame:
+    """Estimates what each free item is worth around a solution, without re-solving.
+
+    For every item and every hero in the optimization, the item is swapped into the hero's slot
+    (replacing the current item, the previous wearer of the item is left with an empty slot).
+    Swaps breaking a constraint are ignored.
+
+    - Removal_Loss: objective lost if the item is taken away from its wearer (0 if unused)
+    - Best_Swap_Change: best objective change from moving the item onto another hero (or onto
+      any hero if unused). Around an optimal solution this is at most 0, values close to 0
+      are items that nearly made it into the solution.
+    - Sellable: unused items that no hero can use without breaking a constraint or reducing the objective
+
+    Optionally, the top candidates are re-checked exactly by solving the model again: the
+    worn items with the largest removal loss are removed from the inventory, and the unused
+    items with the best swap change are forced into the solution.
+
+    Args:
+        opt (Optimizer): optimizer with the constraints and objective of the solution
+        response_dict (Dict): response of a successful run of the optimizer
+        exact_top_n (int, optional): number of worn and unused items to re-check exactly. Defaults to 0.
+        timer (int, optional): solver time limit of each exact re-check. Defaults to 10.
+
+    Returns:
+        pd.DataFrame: one row per free item, most valuable first
+    """
+
+    evaluator = _SwapEvaluator(opt, response_dict["equip_dict"])
+    if exact_top_n and opt.solver is None:
+        opt.define_solver(timer=timer)
+    n_classes = len(opt.class_df)
+
+    # objective change of each hero taking each class (-inf where infeasible or pinned)
+    swap_change = np.full((len(evaluator.heroes), n_classes), -np.inf)
+    # objective change of each hero losing the item in each slot
+    removal_change = np.full((len(evaluator.heroes), len(ItemTypes)), -np.inf)
+
+    for hero in evaluator.heroes:
+        for slot, item_type in enumerate(ItemTypes):
+            if item_type in opt.pinned_slots[hero]:
+                continue
+
+            classes = np.flatnonzero(evaluator.class_slots == slot)
+            change, feasible = evaluator.swap_in(hero, slot, classes)
+            swap_change[hero, classes] = np.where(feasible, change, -np.inf)
+
+            change, feasible = evaluator.swap_in(hero, slot, np.array([-1]))
+            removal_change[hero, slot] = change[0] if feasible[0] else -np.inf
+
+    # wearers of the items in the solution
+    wearers = {
+        item: hero
+        for (hero, item), equipped in response_dict["equip_dict"].items()
+        if equipped
+    }
+
+    rows = []
+    for item, item_class in zip(opt.item_df.index, opt.item_class_ids):
+        slot = evaluator.class_slots[item_class]
+        wearer = wearers.get(item)
+        item_change = swap_change[:, item_class].copy()
+
+        if wearer is None:
+            removal_loss = 0
+        else:
+            # the wearer loses the item, it can't be swapped onto the same hero
+            removal_loss = -removal_change[wearer, slot]
+            item_change += removal_change[wearer, slot]
+            item_change[wearer] = -np.inf
+
+        best_hero = int(np.argmax(item_change))
+        best_change = item_change[best_hero]
+
+        rows.append(
+            {
+                "Item": item,
+                "Name": opt.item_df.loc[item, "name"],
+                "Slot": ItemTypes(opt.item_df.loc[item, "item_type"]).name,
+                "Set": SetTypes(opt.item_df.loc[item, "set_type"]).name,
+                "Equipped_By": opt.hero_base_df.index[wearer]
+                if wearer is not None
+                else None,
+                "Removal_Loss": removal_loss,
+                "Best_Swap_Hero": opt.hero_base_df.index[best_hero]
+                if np.isfinite(best_change)
+                else None,
+                "Best_Swap_Change": best_change
+                if np.isfinite(best_change)
+                else np.nan,
+                "Sellable": wearer is None
+                and not (np.isfinite(best_change) and best_change > 0),
+            }
+        )
+
+    value_df = pd.DataFrame(rows).set_index("Item")
+
+    # worn items are worth what they'd cost to lose, unused ones what they'd bring in
+    value_df["Value"] = np.where(
+        value_df["Equipped_By"].notnull(),
+        value_df["Removal_Loss"],
+        value_df["Best_Swap_Change"].fillna(-np.inf),
+    )
+
+    if exact_top_n:
+        value_df["Exact_Change"] = np.nan
+
+        worn = value_df[value_df["Equipped_By"].notnull()]
+        unused = value_df[value_df["Equipped_By"].isnull()]
+
+        for item in worn.nlargest(exact_top_n, "Removal_Loss").index:
+            value_df.loc[item, "Exact_Change"] = _exact_change(
+                opt, response_dict, item, remove=True, timer=timer
+            )
+        for item in unused.nlargest(exact_top_n, "Value").index:
+            value_df.loc[item, "Exact_Change"] = _exact_change(
+                opt, response_dict, item, remove=False, timer=timer
+            )
+
+    return value_df.sort_values("Value", ascending=False)
+
+
+def _exact_change(opt, response_dict, item, remove, timer):
+    """Re-solves the model with one copy less (remove) or one more in use (not remove) of the
+    item's class, starting from the solution. Returns the objective change or NaN if no solution is found.
+    """
+
+    item_classes = dict(zip(opt.item_df.index, opt.item_class_ids))
+    item_class = item_classes[item]
+    class_vars = [
+        opt.equip_vars[(hero, item_class)] for hero in opt.hero_iterator
+    ]
+    in_use = sum(
+        equipped
+        for (_, other_item), equipped in response_dict["equip_dict"].items()
+        if item_classes.get(other_item) == item_class
+    )
+
+    # solve on a copy so the optimizer's own model is unchanged
+    model = opt.model
+    opt.model = cp_model.CpModel()
+    opt.model.Proto().CopyFrom(model.Proto())
+
+    if remove:
+        opt.model.Add(
+            sum(class_vars)
+            <= int(opt.class_df["class_size"].iloc[item_class]) - 1
+        )
+    else:
+        opt.model.Add(sum(class_vars) >= in_use + 1)
+
+    opt.set_solution_hint(response_dict["equip_dict"])
+
+    time_limit = opt.time_limit
+    opt.time_limit = timer
+    status = opt._solve()
+    opt.time_limit = time_limit
+    opt.model = model
+
+    if status not in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+        return np.nan
+
+    return opt._evaluate_objective() - response_dict["objective_value"]
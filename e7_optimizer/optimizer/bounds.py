@@ -0,0 +1,203 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from optimizer.data_structures import (
+    PERCENT_STAT_MAP,
+    SET_TYPE_STATS,
+    STAT_LIST,
+    ItemTypes,
+)
+
+
+def _to_int_array(df: pd.DataFrame) -> np.ndarray:
+    """rounds the stat columns of a df into an integer array (same rounding as the optimizer)"""
+
+    return np.rint(df[STAT_LIST].to_numpy(dtype=float)).astype(np.int64)
+
+
+def get_stat_bounds(
+    item_df: pd.DataFrame,
+    hero_base_df: pd.DataFrame,
+    hero_additional_df: pd.DataFrame,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Calculates cheap lower and upper bounds on the stats each hero can reach.
+    The stats follow the same integer arithmetic as the optimizer model.
+
+    The upper bound takes the best item per slot for each stat (with percentage stats
+    converted using the hero's base stats) and adds the best possible set bonus.
+    The lower bound is just the stats without any gear, unless items give negative stats.
+
+    Args:
+        item_df (pd.DataFrame): item stats, slots and sets
+        hero_base_df (pd.DataFrame): hero base stats (used for percentage multipliers)
+        hero_additional_df (pd.DataFrame): hero base stats including additional stats
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: lower and upper bounds (heroes x STAT_LIST)
+    """
+
+    item_stats = _to_int_array(item_df)
+    base_stats = _to_int_array(hero_base_df)
+    additional_stats = _to_int_array(hero_additional_df)
+
+    item_types = item_df["item_type"].to_numpy()
+    set_types = item_df["set_type"].to_numpy()
+
+    # stat contribution of every item for every hero (heroes x items x stats)
+    # percentage stats also add onto the stat they modify, e.g. AttackPercent -> Attack
+    contributions = np.repeat(item_stats[None, :, :], len(base_stats), axis=0)
+    for percent_stat, flat_stat in PERCENT_STAT_MAP.items():
+        percent_ix = STAT_LIST.index(percent_stat)
+        flat_ix = STAT_LIST.index(flat_stat)
+        contributions[:, :, flat_ix] += (
+            item_stats[None, :, percent_ix] * base_stats[:, flat_ix, None]
+        ) // 100
+
+    lower_bounds = additional_stats.copy()
+    upper_bounds = additional_stats.copy()
+
+    # best (and worst) item per slot, an empty slot contributes nothing
+    for item_type in ItemTypes:
+        slot_contributions = contributions[:, item_types == item_type, :]
+        if slot_contributions.shape[1] == 0:
+            continue
+        upper_bounds += np.maximum(slot_contributions.max(axis=1), 0)
+        lower_bounds += np.minimum(slot_contributions.min(axis=1), 0)
+
+    # best possible set bonus -> 2 piece bonuses can stack,
+    # but only one 4 piece set can be active (e.g. speed and revenge)
+    two_piece_bonus = np.zeros_like(upper_bounds)
+    four_piece_bonus = np.zeros_like(upper_bounds)
+
+    for set_type, vals in SET_TYPE_STATS.items():
+        if "stat" not in vals:
+            continue
+
+        # a set can't be active more often than there are slots with pieces of it
+        slots_with_set = len(set(item_types[set_types == set_type]))
+        max_active = slots_with_set // vals["threshold"]
+
+        bonus = np.zeros_like(upper_bounds)
+        bonus[:, STAT_LIST.index(vals["stat"])] = (
+            max_active * vals["stat_bonus"]
+        )
+
+        if vals["stat"] in PERCENT_STAT_MAP:
+            flat_ix = STAT_LIST.index(PERCENT_STAT_MAP[vals["stat"]])
+            bonus[:, flat_ix] = max_active * (
+                (vals["stat_bonus"] * base_stats[:, flat_ix]) // 100
+            )
+
+        if vals["threshold"] == 2:
+            two_piece_bonus += bonus
+        else:
+            four_piece_bonus = np.maximum(four_piece_bonus, bonus)
+
+    upper_bounds += two_piece_bonus + four_piece_bonus
+
+    lower_df = pd.DataFrame(
+        lower_bounds, index=hero_base_df.index, columns=STAT_LIST
+    )
+    upper_df = pd.DataFrame(
+        upper_bounds, index=hero_base_df.index, columns=STAT_LIST
+    )
+
+    return lower_df, upper_df
+
+
+def check_constraint_bounds(
+    item_df: pd.DataFrame,
+    hero_base_df: pd.DataFrame,
+    hero_additional_df: pd.DataFrame,
+    hero_min_df: pd.DataFrame,
+    hero_max_df: pd.DataFrame,
+    set_constraints_df: pd.DataFrame,
+) -> pd.DataFrame:
+    """Pre-check run before the solver to reject constraints that can never be met.
+    e.g. a 300 speed minimum when the best gear can only reach 250.
+
+    Args:
+        item_df (pd.DataFrame): item stats, slots and sets
+        hero_base_df (pd.DataFrame): hero base stats
+        hero_additional_df (pd.DataFrame): hero base stats including additional stats
+        hero_min_df (pd.DataFrame): minimum stat constraints
+        hero_max_df (pd.DataFrame): maximum stat constraints
+        set_constraints_df (pd.DataFrame): set type constraints
+
+    Returns:
+        pd.DataFrame: one row per unreachable constraint, empty if none are found
+    """
+
+    lower_df, upper_df = get_stat_bounds(
+        item_df, hero_base_df, hero_additional_df
+    )
+
+    min_df = pd.DataFrame(
+        _to_int_array(hero_min_df), index=lower_df.index, columns=STAT_LIST
+    )
+    max_df = pd.DataFrame(
+        _to_int_array(hero_max_df), index=lower_df.index, columns=STAT_LIST
+    )
+
+    conflicts = []
+
+    # minimums above the best achievable stats
+    for (hero, stat), limit in min_df.where(min_df > upper_df).stack().items():
+        conflicts.append(
+            {
+                "Hero": hero,
+                "Constraint": f"{stat} minimum",
+                "Limit": int(limit),
+                "Achievable_Bound": int(upper_df.loc[hero, stat]),
+            }
+        )
+
+    # maximums below the stats the hero already has without gear
+    for (hero, stat), limit in max_df.where(max_df < lower_df).stack().items():
+        conflicts.append(
+            {
+                "Hero": hero,
+                "Constraint": f"{stat} maximum",
+                "Limit": int(limit),
+                "Achievable_Bound": int(lower_df.loc[hero, stat]),
+            }
+        )
+
+    # set requirements that can't be built from the available pieces
+    item_types = item_df["item_type"].to_numpy()
+    set_types = item_df["set_type"].to_numpy()
+
+    for hero, set_list in set_constraints_df.iloc[:, 0].items():
+        if not isinstance(set_list, (list, tuple)) or not set_list:
+            continue
+
+        required_pieces = sum(
+            SET_TYPE_STATS[set_type]["threshold"] for set_type in set_list
+        )
+        if required_pieces > len(ItemTypes):
+            conflicts.append(
+                {
+                    "Hero": hero,
+                    "Constraint": "Set pieces",
+                    "Limit": required_pieces,
+                    "Achievable_Bound": len(ItemTypes),
+                }
+            )
+
+        for set_type in set_list:
+            slots_with_set = len(set(item_types[set_types == set_type]))
+            if slots_with_set < SET_TYPE_STATS[set_type]["threshold"]:
+                conflicts.append(
+                    {
+                        "Hero": hero,
+                        "Constraint": f"{set_type.name} set pieces",
+                        "Limit": SET_TYPE_STATS[set_type]["threshold"],
+                        "Achievable_Bound": slots_with_set,
+                    }
+                )
+
+    return pd.DataFrame(
+        conflicts, columns=["Hero", "Constraint", "Limit", "Achievable_Bound"]
+    )
@@ -0,0 +1,116 @@
+import copy
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def hash_dataframe(df: pd.DataFrame) -> str:
+    """Stable content hash of a dataframe (values, index and column labels).
+    Numeric values are hashed as the rounded integers the optimizer works with,
+    other values via their string representation so object columns
+    (e.g. lists of set constraints) are handled as well.
+    """
+
+    df = df.copy()
+    numeric_cols = df.select_dtypes(np.number).columns
+    df[numeric_cols] = df[numeric_cols].round().astype("Int64")
+
+    hasher = hashlib.sha256()
+    hasher.update(repr(list(df.columns)).encode())
+    hasher.update(
+        pd.util.hash_pandas_object(df.astype(str), index=True)
+        .to_numpy()
+        .tobytes()
+    )
+
+    return hasher.hexdigest()
+
+
+def hash_optimizer_inputs(*dfs: pd.DataFrame, **settings) -> str:
+    """Combines the hashes of all optimizer input tables and settings into a single key.
+
+    Args:
+        *dfs (pd.DataFrame): input tables, order matters
+        **settings: any other values that change the result (e.g. tiered mode)
+
+    Returns:
+        str: hex digest identifying the optimizer run
+    """
+
+    hasher = hashlib.sha256()
+    for df in dfs:
+        hasher.update(hash_dataframe(df).encode())
+    hasher.update(json.dumps(settings, sort_keys=True, default=str).encode())
+
+    return hasher.hexdigest()
+
+
+class ResultCache:
+    """
+    Thread safe LRU cache of optimizer results keyed by the hash of the optimizer inputs.
+    Entries are kept in memory and optionally mirrored to disk as pickles, so they
+    survive restarts. Each entry stores the response_dict along with the solver time used.
+    Entries are copied in and out, so callers can't change a cached result through the one they hold.
+    """
+
+    def __init__(self, max_entries: int = 32, cache_dir: str = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Returns the cached entry for the key (or None) and marks it as recently used"""
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return copy.deepcopy(self._entries[key])
+
+        if self.cache_dir and os.path.isfile(self._path(key)):
+            with open(self._path(key), "rb") as f:
+                entry = pickle.load(f)
+            self._store(key, entry)
+            return copy.deepcopy(entry)
+
+        return None
+
+    def put(self, key: str, response_dict: Dict, solver_time: float):
+        """Stores a result, evicting the least recently used entry if full"""
+
+        entry = {
+            "response_dict": copy.deepcopy(response_dict),
+            "solver_time": solver_time,
+        }
+
+        # written to a temporary file first, so a crash mid-write can't leave a corrupt entry
+        if self.cache_dir:
+            with open(f"{self._path(key)}.tmp", "wb") as f:
+                pickle.dump(entry, f)
+            os.replace(f"{self._path(key)}.tmp", self._path(key))
+
+        self._store(key, entry)
+
+    def _store(self, key: str, entry: Dict):
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                if self.cache_dir and os.path.isfile(self._path(evicted_key)):
+                    os.remove(self._path(evicted_key))
@@ -0,0 +1,210 @@
+import os
+import pickle
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ortools.sat.python import cp_model
+
+
+class EarlyStopping:
+    """
+    Stops the search once the solution is good enough or stops improving, rather than running
+    until optimality or the time limit:
+
+    - relative_gap: (bound - objective) / |bound| is at most this (e.g. 0.001 for 0.1%)
+    - absolute_gap: bound - objective is at most this
+    - stall_time: no better solution found for this many seconds (counted from the first solution)
+
+    Gaps are checked whenever a solution is found, the stall time by a watchdog thread.
+    objective_units converts solver objective values into the units the gaps are given in.
+    The criterion that stopped the last search is kept in reason (None if it wasn't stopped).
+    """
+
+    def __init__(
+        self,
+        relative_gap: float = None,
+        absolute_gap: float = None,
+        stall_time: float = None,
+        objective_units: Callable[[float], float] = None,
+    ):
+        self.relative_gap = relative_gap
+        self.absolute_gap = absolute_gap
+        self.stall_time = stall_time
+        self.objective_units = objective_units or (lambda value: value)
+        self.reason = None
+
+        self._lock = threading.Lock()
+        self._callback = None
+        self._best_objective = None
+        self._last_improvement = None
+        self._finished = threading.Event()
+
+    def start(self, callback: cp_model.CpSolverSolutionCallback):
+        """Call before solving with the solution callback of the search"""
+
+        self.reason = None
+        self._callback = callback
+        self._best_objective = None
+        self._last_improvement = None
+        self._finished.clear()
+
+        if self.stall_time:
+            threading.Thread(target=self._watch_stall, daemon=True).start()
+
+    def finish(self):
+        """Call once the search is over"""
+
+        with self._lock:
+            self._callback = None
+        self._finished.set()
+
+    def on_solution(self, callback: cp_model.CpSolverSolutionCallback):
+        """Checks the gap criteria for a new solution"""
+
+        objective = self.objective_units(callback.ObjectiveValue())
+        bound = self.objective_units(callback.BestObjectiveBound())
+        gap = bound - objective
+
+        if self._best_objective is None or objective > self._best_objective:
+            self._best_objective = objective
+            self._last_improvement = time.time()
+
+        if self.absolute_gap is not None and gap <= self.absolute_gap:
+            self._stop(f"absolute gap {gap:g} <= {self.absolute_gap:g}")
+        elif self.relative_gap is not None and gap <= self.relative_gap * abs(
+            bound
+        ):
+            self._stop(
+                f"relative gap {gap / max(abs(bound), 1):.3%} <= {self.relative_gap:.3%}"
+            )
+
+    def _watch_stall(self):
+
+        while not self._finished.wait(min(self.stall_time / 10, 0.5)):
+            if (
+                self._last_improvement is not None
+                and time.time() - self._last_improvement >= self.stall_time
+            ):
+                self._stop(f"no improvement for {self.stall_time:g}s")
+                return
+
+    def _stop(self, reason: str):
+
+        # the callback is only stopped while its search is running
+        with self._lock:
+            if self._callback is not None and self.reason is None:
+                self.reason = reason
+                self._callback.StopSearch()
+
+
+class SolutionPrinter(cp_model.ObjectiveSolutionPrinter):
+    """Objective solution printer which can stop the search early (see EarlyStopping)"""
+
+    def __init__(self):
+        super().__init__()
+        self.early_stopping: Optional[EarlyStopping] = None
+
+    def on_solution_callback(self):
+        super().on_solution_callback()
+
+        if self.early_stopping is not None:
+            self.early_stopping.on_solution(self)
+
+
+class SolutionPool(SolutionPrinter):
+    """
+    Solution printer that also keeps every solution found during search, as
+    (objective value, values of the given variables). Intermediate solutions are often
+    good alternatives in their own right, so they can be reused (e.g. as hints) later on.
+    Solutions are passed on to the checkpoint writer, if given (set it to None to stop).
+    """
+
+    def __init__(
+        self,
+        variables: List[cp_model.IntVar],
+        checkpoint: Optional["CheckpointWriter"] = None,
+    ):
+        super().__init__()
+        self.variables = variables
+        self.checkpoint = checkpoint
+        self.solutions: List[Tuple[float, Tuple[int, ...]]] = []
+
+    def on_solution_callback(self):
+        super().on_solution_callback()
+
+        self.solutions.append(
+            (
+                self.ObjectiveValue(),
+                tuple(self.Value(var) for var in self.variables),
+            )
+        )
+
+        if self.checkpoint is not None:
+            self.checkpoint.on_solution(self)
+
+
+class CheckpointWriter(SolutionPrinter):
+    """
+    Solution printer that persists the incumbent solution to disk, so long runs can be resumed
+    if the session dies. snapshot(source) builds the checkpoint contents from a solution callback
+    or the solver.
+
+    Writes are throttled to one per interval seconds. The snapshot is only built when a write
+    is due, as it's too slow to build for every solution on the solver's callback thread.
+    The latest solution is written by flush(solver) once the solve finishes.
+    Files are replaced atomically, so a reader never sees a partially written checkpoint.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        snapshot: Callable[[cp_model.CpSolverSolutionCallback], Dict],
+        interval: float = 10.0,
+    ):
+        super().__init__()
+        self.path = path
+        self.snapshot = snapshot
+        self.interval = interval
+        self._last_write = 0.0
+
+    def on_solution_callback(self):
+        super().on_solution_callback()
+
+        self.on_solution(self)
+
+    def on_solution(self, source: cp_model.CpSolverSolutionCallback):
+        """Writes the checkpoint of a new solution of source if a write is due"""
+
+        if time.time() - self._last_write >= self.interval:
+            self.write(source)
+
+    def flush(self, solver: cp_model.CpSolver):
+        """Writes the final solution of the solver, so the checkpoint matches the solve result"""
+
+        self.write(solver)
+
+    def write(self, source):
+        """Writes the checkpoint of the current solution of source (a callback or the solver)"""
+
+        contents = self.snapshot(source)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(f"{self.path}.tmp", "wb") as f:
+            pickle.dump(contents, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+        self._last_write = time.time()
+
+    @staticmethod
+    def load(path: str) -> Optional[Dict]:
+        """Returns the checkpoint at the path, or None if there is none"""
+
+        if not os.path.isfile(path):
+            return None
+
+        with open(path, "rb") as f:
+            return pickle.load(f)
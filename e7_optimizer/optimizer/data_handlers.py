@@ -1,6 +1,8 @@
 import os
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
 
+import numpy as np
 import pandas as pd
 import requests
 
@@ -59,6 +61,21 @@ def get_raw_hero_data() -> pd.DataFrame:
     return df
 
 
+@lru_cache(maxsize=None)
+def get_hero_reference_data() -> pd.DataFrame:
+    """
+    Hero base stats loaded once per process and shared by all sessions.
+    The values are read-only, subsets taken with .loc are copies if a session needs to modify them.
+    """
+
+    df = get_raw_hero_data()
+
+    values = df.to_numpy(dtype=float, copy=True)
+    values.flags.writeable = False
+
+    return pd.DataFrame(values, index=df.index, columns=df.columns, copy=False)
+
+
 def get_user_hero_data(data, awaken_levels=[4, 5, 6]) -> List[Dict]:
     """
     Extracts required hero data from user's hero data (base stats).
@@ -103,14 +120,183 @@ def get_user_item_data(hero_and_gear_data) -> List[Dict]:
     return user_item_data
 
 
-def generate_item_objects_from_list(user_item_data: List[Dict]) -> List[Item]:
+def get_item_owners(hero_and_gear_data) -> Dict[int, str]:
+    """
+    Gets the name of the hero currently wearing each item based on the ingameEquippedId field.
+    Unequipped items are given None. All heroes in the gear file are considered,
+    not just the ones available to the optimizer.
+
+    Args:
+        hero_and_gear_data ([type]): 'raw' json user data on heroes and gear
+
+    Returns:
+        Dict[int, str]: {item id: hero name (or None)} for each item in the gear file
+    """
+
+    hero_names = {
+        hero["id"]: hero["name"] for hero in hero_and_gear_data["heroes"]
+    }
+
+    item_owners = {
+        item["id"]: None
+        if item["ingameEquippedId"] == "undefined"
+        else hero_names.get(
+            int(item["ingameEquippedId"]), item["ingameEquippedId"]
+        )
+        for item in hero_and_gear_data["items"]
+    }
+
+    return item_owners
+
+
+def diff_user_item_data(
+    old_item_data: Dict[int, Dict], new_item_data: Dict[int, Dict]
+) -> Dict[str, List[int]]:
+    """
+    Compares the item data of two gear files based on the item id field.
+
+    - added: ids only in the new file
+    - removed: ids only in the old file
+    - modified: stats, slot or set changed (e.g. after enhancing or reforging)
+    - owner_changed: only the hero wearing the item changed
+
+    Args:
+        old_item_data (Dict[int, Dict]): {item id: item data} of the loaded gear file
+        new_item_data (Dict[int, Dict]): {item id: item data} of the new gear file
+
+    Returns:
+        Dict[str, List[int]]: item ids for each type of change
+    """
+
+    item_diff = {
+        "added": [i for i in new_item_data if i not in old_item_data],
+        "removed": [i for i in old_item_data if i not in new_item_data],
+        "modified": [],
+        "owner_changed": [],
+    }
+
+    for item_id, new_item in new_item_data.items():
+        old_item = old_item_data.get(item_id)
+        if old_item is None or old_item == new_item:
+            continue
+
+        if {**old_item, "ingameEquippedId": None} != {
+            **new_item,
+            "ingameEquippedId": None,
+        }:
+            item_diff["modified"].append(item_id)
+        else:
+            item_diff["owner_changed"].append(item_id)
+
+    return item_diff
+
+
+def patch_item_df(
+    item_df: pd.DataFrame,
+    new_item_objects: Dict[int, Item],
+    item_owners: Dict[int, str],
+    item_order: List[int],
+    dropped_items: Iterable[int] = (),
+    owner_changed_items: Iterable[int] = (),
+) -> pd.DataFrame:
+    """
+    Applies an item diff to the canonical item table rather than rebuilding it.
+    Rows are put in the order of the new gear file, so the result is identical
+    to building the table from scratch.
+
+    Args:
+        item_df (pd.DataFrame): current item table, including the 'equipped_by' column
+        new_item_objects (Dict[int, Item]): added and modified items
+        item_owners (Dict[int, str]): {item id: hero name} from the new gear file
+        item_order (List[int]): item ids in the order of the new gear file
+        dropped_items (Iterable[int], optional): removed and modified item ids. Defaults to ().
+        owner_changed_items (Iterable[int], optional): item ids that changed hero. Defaults to ().
+
+    Returns:
+        pd.DataFrame: patched item table
+    """
+
+    item_df = item_df.drop(index=list(dropped_items))
+
+    if new_item_objects:
+        new_item_df = get_item_df(new_item_objects)
+        new_item_df["equipped_by"] = [item_owners[i] for i in new_item_df.index]
+        item_df = pd.concat([item_df, new_item_df])
+
+    owner_changed_items = list(owner_changed_items)
+    item_df.loc[owner_changed_items, "equipped_by"] = [
+        item_owners[i] for i in owner_changed_items
+    ]
+
+    return item_df.reindex(item_order)
+
+
+def get_optimizer_item_scope(
+    item_df: pd.DataFrame,
+    selected_hero_list: List[str],
+    pinned_items: Dict[int, str] = None,
+    excluded_items: Iterable[int] = (),
+    unequipped_or_selected_only: bool = False,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Splits the items into the free inventory the optimizer can assign and
+    the items pinned to (i.e. locked on) the selected heroes.
+
+    - Excluded items are dropped.
+    - Items pinned to a selected hero are returned separately to be used as constants.
+    - Items pinned to heroes outside the selection are dropped so they aren't stripped.
+    - Optionally, items worn by heroes outside the selection are dropped as well.
+
+    Item indices are retained so optimizer results can still be mapped back to item objects.
+
+    Args:
+        item_df (pd.DataFrame): canonical item table, including the 'equipped_by' column
+        selected_hero_list (List[str]): heroes in the optimizer
+        pinned_items (Dict[int, str], optional): {item id: hero name} locks. Defaults to None.
+        excluded_items (Iterable[int], optional): item ids to leave out. Defaults to ().
+        unequipped_or_selected_only (bool, optional): limit to items that are unequipped or worn
+            by the selected heroes. Defaults to False.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: free items, pinned items (with a 'pinned_hero' column)
+    """
+
+    pinned_items = pinned_items or {}
+    pinned_heroes = pd.Series(pinned_items, dtype=object).reindex(item_df.index)
+
+    keep_mask = ~item_df.index.isin(list(excluded_items))
+
+    # anything locked to a hero is removed from the free inventory
+    keep_mask &= pinned_heroes.isnull().values
+
+    if unequipped_or_selected_only:
+        keep_mask &= (
+            item_df["equipped_by"].isnull()
+            | item_df["equipped_by"].isin(selected_hero_list)
+        ).values
+
+    free_item_df = item_df[keep_mask]
+
+    # locked items are only used if they're locked to a selected hero
+    pinned_mask = pinned_heroes.isin(selected_hero_list).values
+    pinned_mask &= ~item_df.index.isin(list(excluded_items))
+
+    pinned_item_df = item_df[pinned_mask].copy()
+    pinned_item_df["pinned_hero"] = pinned_heroes[pinned_mask]
+
+    return free_item_df, pinned_item_df
+
+
+def generate_item_objects_from_list(
+    user_item_data: List[Dict],
+) -> Dict[int, Item]:
     """Parses the fields loaded from the gear file and generates an item object for each item.
 
     Args:
         user_item_data (List[Dict]): [description]
 
     Returns:
-        List[Item]: [description]
+        Dict[int, Item]: {item id: item object}
     """
 
     # look ups for converting naming convention used in gear file to project names
@@ -147,7 +333,7 @@ def generate_item_objects_from_list(user_item_data: List[Dict]) -> List[Item]:
         "speed": "Speed",
     }
 
-    item_objects = []
+    item_objects = {}
 
     for item in user_item_data:
 
@@ -173,26 +359,24 @@ def generate_item_objects_from_list(user_item_data: List[Dict]) -> List[Item]:
         combined_stats = {i["type"]: int(i["value"]) for i in substats}
         combined_stats[mainstat_map[mainstat_type]] = int(mainstat_value)
 
-        item_objects.append(
-            Item(
-                name=name,
-                item_type=ItemTypes[item_type.upper()],
-                set_type=set_map[set_type],
-                stats=StatStick.from_dict(combined_stats),
-            )
+        item_objects[item["id"]] = Item(
+            name=name,
+            item_type=ItemTypes[item_type.upper()],
+            set_type=set_map[set_type],
+            stats=StatStick.from_dict(combined_stats),
         )
 
     return item_objects
 
 
-def get_item_df(item_objects: List[Item]) -> pd.DataFrame:
-    """Generates a dataframe of item information from the list of item objects.
+def get_item_df(item_objects: Dict[int, Item]) -> pd.DataFrame:
+    """Generates a dataframe of item information from the item objects, indexed by item id.
     The main use case is as an input to the optimizer.
 
     TODO: Maybe add method to Item class to generate a dataframe representation
 
     Args:
-        item_objects (List[Item]): [description]
+        item_objects (Dict[int, Item]): {item id: item object}
 
     Returns:
         pd.DataFrame: [description]
@@ -200,7 +384,7 @@ def get_item_df(item_objects: List[Item]) -> pd.DataFrame:
 
     parsed_items = []
 
-    for item in item_objects:
+    for item in item_objects.values():
         info_dict = item.stats.__dict__
         info_dict["name"] = item.name
         info_dict["set_type"] = item.set_type
@@ -208,9 +392,33 @@ def get_item_df(item_objects: List[Item]) -> pd.DataFrame:
 
         parsed_items.append(info_dict)
 
-    item_df = pd.DataFrame(parsed_items)
+    item_df = pd.DataFrame(parsed_items, index=list(item_objects.keys()))
+    item_df.index.name = "id"
+
+    return to_int_table(item_df)
+
+
+def to_int_table(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns a copy of the df with all numerical columns rounded to int32, the representation
+    the optimizer works with. Tables are converted once when they're created so the optimizer
+    can use them as they are on every run, without converting or modifying them.
+
+    Args:
+        df (pd.DataFrame): table with float and/or integer columns
+
+    Returns:
+        pd.DataFrame: [description]
+    """
+
+    numeric_cols = df.select_dtypes(np.number).columns
+
+    int_df = df.copy()
+    int_df[numeric_cols] = np.rint(
+        df[numeric_cols].to_numpy(dtype=float)
+    ).astype(np.int32)
 
-    return item_df
+    return int_df
 
 
 def generate_hero_objects_from_df(
@@ -260,7 +468,7 @@ def generate_initial_equip_dict(user_hero_data, user_item_data) -> Dict:
     This structure conforms with the optimizer equip variables,
     and so could be used for initialisation.
 
-    {(hero_id, user_id): 0 or 1 }
+    {(hero_index, item_id): 0 or 1 }
 
     Matches are based on the IDs provided in the user's gear file.
 
@@ -275,7 +483,8 @@ def generate_initial_equip_dict(user_hero_data, user_item_data) -> Dict:
 
     initial_equip_dict = {}
     for hero_id, hero in enumerate(user_hero_data):
-        for item_id, item in enumerate(user_item_data):
+        for item in user_item_data:
+            item_id = item["id"]
             if item["ingameEquippedId"] == "undefined":
                 initial_equip_dict[(hero_id, item_id)] = 0
             elif int(item["ingameEquippedId"]) == hero["id"]:
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass, fields
 from enum import IntEnum, auto, unique
 from functools import reduce
@@ -24,6 +25,15 @@ ARTIFACT_DATA_URL = "http://e7-optimizer-game-data.s3-accelerate.amazonaws.com/a
 
 HERO_DATA_PATH = "./data/hero_data.csv"
 
+# tuned solver parameters per problem size, created by optimizer/tuning.py
+# resolved from the package rather than the working directory, as the tuning script runs from elsewhere
+SOLVER_PROFILE_PATH = os.path.normpath(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "../../data/solver_profiles.json",
+    )
+)
+
 
 #############
 ### ENUMS ###
@@ -186,9 +196,26 @@ SET_TYPE_STATS = {
     SetTypes.RAGE: {"threshold": 4},
     SetTypes.UNITY: {"threshold": 2},
     SetTypes.COUNTER: {"threshold": 4},
+    SetTypes.INJURY: {"threshold": 4},
 }
 
 STAT_LIST = list(StatStick().__dict__.keys())
+
+# mapping between stat modifiers and the stat they modify
+PERCENT_STAT_MAP = {
+    "DefensePercent": "Defense",
+    "HealthPercent": "Health",
+    "SpeedPercent": "Speed",
+    "AttackPercent": "Attack",
+}
+
+# stat resolution used by the coarse stage of coarse-to-fine solving (e.g. Health in steps of 50)
+COARSE_STAT_BUCKETS = {
+    "Attack": 10,
+    "Health": 50,
+    "Defense": 10,
+}
+
 HIDDEN_STAT_COLS = [
     "AttackPercent",
     "HealthPercent",
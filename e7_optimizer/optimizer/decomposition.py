@@ -0,0 +1,641 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from optimizer.data_structures import (
+    PERCENT_STAT_MAP,
+    STAT_LIST,
+    STAT_NORMALISATION_DICT,
+    ItemTypes,
+    SetTypes,
+)
+from optimizer.optimizer import Optimizer
+
+
+def get_hero_demand(
+    hero_additional_df: pd.DataFrame,
+    hero_min_df: pd.DataFrame,
+    set_constraints_df: pd.DataFrame,
+    stat_weightings_df: pd.DataFrame,
+) -> pd.DataFrame:
+    """What each hero wants from its gear: the weighted stats, stats with a minimum
+    above what the hero already has (scored by their normalisation value) and required sets.
+    Stat demand is in objective units per stat point, so it can be used to score items.
+
+    Returns:
+        pd.DataFrame: heroes x (STAT_LIST + names of required set types) demand
+    """
+
+    weights = stat_weightings_df.reindex(columns=STAT_LIST).fillna(0)
+    normalisation = (
+        pd.Series(STAT_NORMALISATION_DICT).reindex(STAT_LIST).fillna(0)
+    )
+    min_constrained = (
+        hero_min_df[STAT_LIST].to_numpy()
+        > hero_additional_df[STAT_LIST].to_numpy()
+    )
+    stat_demand = (
+        weights.to_numpy(dtype=float)
+        + min_constrained * normalisation.to_numpy()
+    )
+
+    set_demand = pd.DataFrame(
+        [
+            {set_type.name: 1.0 for set_type in set_list}
+            if isinstance(set_list, (list, tuple))
+            else {}
+            for set_list in set_constraints_df.iloc[:, 0]
+        ],
+        index=hero_additional_df.index,
+    )
+
+    return pd.concat(
+        [
+            pd.DataFrame(
+                stat_demand, index=hero_additional_df.index, columns=STAT_LIST
+            ),
+            set_demand,
+        ],
+        axis=1,
+    ).fillna(0)
+
+
+def _get_similarity(demand: np.ndarray) -> np.ndarray:
+    """cosine similarity between demand vectors, stats and sets weighted equally"""
+
+    stat_demand = demand[:, : len(STAT_LIST)]
+    stat_demand = stat_demand / np.maximum(
+        np.linalg.norm(stat_demand, axis=1, keepdims=True), 1e-9
+    )
+    demand = np.hstack([stat_demand, demand[:, len(STAT_LIST) :]])
+    demand = demand / np.maximum(
+        np.linalg.norm(demand, axis=1, keepdims=True), 1e-9
+    )
+
+    return demand @ demand.T
+
+
+def cluster_heroes(
+    demand_df: pd.DataFrame, cluster_size: int
+) -> List[List[int]]:
+    """Groups heroes with overlapping demand (similar stats and sets) into clusters of
+    at most cluster_size heroes. Heroes competing for the same items end up in the same
+    cluster, so those trade-offs are solved exactly within one model.
+
+    Clusters are seeded with the most dissimilar heroes (farthest point), then every hero joins
+    the non-full cluster it's most similar to, starting with the heroes with the strongest preference.
+
+    Returns:
+        List[List[int]]: hero indices (demand_df row positions) of each cluster
+    """
+
+    n_heroes = len(demand_df)
+    n_clusters = math.ceil(n_heroes / cluster_size)
+    similarity = _get_similarity(demand_df.to_numpy())
+
+    # farthest point seeding
+    seeds = [int(np.argmax(similarity.sum(axis=1)))]
+    while len(seeds) < n_clusters:
+        closest = similarity[:, seeds].max(axis=1)
+        closest[seeds] = np.inf
+        seeds.append(int(np.argmin(closest)))
+
+    clusters = [[seed] for seed in seeds]
+    remaining = [hero for hero in range(n_heroes) if hero not in seeds]
+
+    while remaining:
+        open_clusters = [c for c in clusters if len(c) < cluster_size]
+        affinity = np.array(
+            [
+                [similarity[hero, cluster].mean() for cluster in open_clusters]
+                for hero in remaining
+            ]
+        )
+
+        # the hero with the clearest favourite picks first
+        preference = affinity.max(axis=1) - affinity.mean(axis=1)
+        pick = int(np.argmax(preference))
+        open_clusters[int(np.argmax(affinity[pick]))].append(
+            remaining.pop(pick)
+        )
+
+    return [sorted(cluster) for cluster in clusters]
+
+
+def _get_item_scores(
+    item_df: pd.DataFrame, hero_base_df: pd.DataFrame, demand_df: pd.DataFrame
+) -> np.ndarray:
+    """Scores every item for every hero (heroes x items) against the hero's stat demand.
+    Percentage stats are converted with the hero's base stats (same as the optimizer).
+    """
+
+    item_stats = item_df[STAT_LIST].to_numpy(dtype=float)
+    base_stats = hero_base_df[STAT_LIST].to_numpy(dtype=float)
+
+    contributions = np.repeat(item_stats[None, :, :], len(base_stats), axis=0)
+    for percent_stat, flat_stat in PERCENT_STAT_MAP.items():
+        percent_ix = STAT_LIST.index(percent_stat)
+        flat_ix = STAT_LIST.index(flat_stat)
+        contributions[:, :, flat_ix] += (
+            item_stats[None, :, percent_ix] * base_stats[:, flat_ix, None] / 100
+        )
+
+    return np.einsum(
+        "his,hs->hi", contributions, demand_df[STAT_LIST].to_numpy()
+    )
+
+
+def split_item_budgets(
+    item_df: pd.DataFrame,
+    hero_base_df: pd.DataFrame,
+    demand_df: pd.DataFrame,
+    clusters: List[List[int]],
+) -> List[pd.Index]:
+    """Splits the items into disjoint budgets, one per cluster, with a draft.
+    For each slot, heroes take turns picking their best remaining item (clusters alternating),
+    so each cluster gets items in proportion to its size. Heroes with required sets
+    alternate between their best item of a required set and their best item overall.
+
+    Returns:
+        List[pd.Index]: item_df index labels in each cluster's budget
+    """
+
+    scores = _get_item_scores(item_df, hero_base_df, demand_df)
+    item_types = item_df["item_type"].to_numpy()
+    # set types are ints in the optimizer tables (see data_handlers.to_int_table)
+    set_names = np.array(
+        [SetTypes(int(set_type)).name for set_type in item_df["set_type"]]
+    )
+    set_cols = [col for col in demand_df.columns if col not in STAT_LIST]
+
+    # draft order interleaves the clusters: 1st hero of each cluster, 2nd hero of each cluster...
+    draft_order = [
+        (cluster_ix, cluster[position])
+        for position in range(max(len(c) for c in clusters))
+        for cluster_ix, cluster in enumerate(clusters)
+        if position < len(cluster)
+    ]
+    required_sets = {
+        hero: [col for col in set_cols if demand_df.iloc[hero][col] > 0]
+        for _, hero in draft_order
+    }
+
+    budgets = [[] for _ in clusters]
+
+    for item_type in ItemTypes:
+        available = np.flatnonzero(item_types == item_type)
+        draft_round = 0
+        while len(available):
+            for cluster_ix, hero in draft_order:
+                if not len(available):
+                    break
+
+                options = available
+                if required_sets[hero] and draft_round % 2 == 0:
+                    set_options = available[
+                        np.isin(set_names[available], required_sets[hero])
+                    ]
+                    if len(set_options):
+                        options = set_options
+
+                pick = options[np.argmax(scores[hero, options])]
+                budgets[cluster_ix].append(pick)
+                available = available[available != pick]
+            draft_round += 1
+
+    return [item_df.index[sorted(budget)] for budget in budgets]
+
+
+class _SubProblem:
+    """A group of heroes with its own item budget, solved as a separate Optimizer"""
+
+    def __init__(self, heroes: List[int], items: pd.Index):
+        self.heroes = heroes
+        self.items = items
+        self.response_dict = None
+
+    @property
+    def objective_value(self):
+        if (
+            self.response_dict is None
+            or self.response_dict["equip_dict"] is None
+        ):
+            return None
+        return self.response_dict["objective_value"]
+
+
+class DecomposedOptimizer:
+    """
+    Optimizes large groups of heroes (e.g. a whole roster) by splitting them into clusters.
+
+    1. Heroes are clustered by overlapping demand (see cluster_heroes).
+    2. The items are drafted into disjoint budgets per cluster (see split_item_budgets).
+    3. The clusters are solved in parallel, each as a regular Optimizer.
+    4. Pairs of clusters with the most similar demand are re-solved together on their combined
+       budgets (warm started from the current solution), so items can move between them.
+       Items worn afterwards go to the cluster of the wearer, unused ones return to where they were.
+
+    Results are merged into a single response dictionary as returned by Optimizer.run_solver,
+    plus a report of the clusters and exchanges. As each cluster only sees part of the items
+    the result is never proven optimal.
+    """
+
+    def __init__(
+        self,
+        item_df: pd.DataFrame,
+        hero_base_df: pd.DataFrame,
+        hero_additional_df: pd.DataFrame,
+        hero_min_df: pd.DataFrame,
+        hero_max_df: pd.DataFrame,
+        set_constraints_df: pd.DataFrame,
+        stat_weightings_df: pd.DataFrame,
+        pinned_item_df: pd.DataFrame = None,
+        cluster_size: int = 6,
+    ):
+        self.item_df = item_df
+        self.hero_base_df = hero_base_df
+        self.hero_additional_df = hero_additional_df
+        self.hero_min_df = hero_min_df
+        self.hero_max_df = hero_max_df
+        self.set_constraints_df = set_constraints_df
+        self.stat_weightings_df = stat_weightings_df
+
+        if pinned_item_df is None:
+            pinned_item_df = item_df.iloc[:0].assign(pinned_hero=None)
+        self.pinned_item_df = pinned_item_df
+
+        self.demand_df = get_hero_demand(
+            hero_additional_df,
+            hero_min_df,
+            set_constraints_df,
+            stat_weightings_df,
+        )
+        hero_clusters = cluster_heroes(self.demand_df, cluster_size)
+        item_budgets = split_item_budgets(
+            self.item_df, self.hero_base_df, self.demand_df, hero_clusters
+        )
+        self.clusters = [
+            _SubProblem(heroes, items)
+            for heroes, items in zip(hero_clusters, item_budgets)
+        ]
+
+        # pairs whose exchange found nothing, skipped until one of them changes
+        self.stale_pairs = set()
+
+    def _solve_subproblem(
+        self, heroes, items, equip_dict, timer, worker_count
+    ) -> Dict:
+        """Solves the given heroes on the given items (warm started from equip_dict if given).
+        Returns the response_dict with equip_dict keys mapped back onto global hero indices.
+        """
+
+        hero_names = self.hero_base_df.index[heroes]
+
+        opt = Optimizer(
+            item_df=self.item_df.loc[items],
+            hero_base_df=self.hero_base_df.loc[hero_names],
+            hero_additional_df=self.hero_additional_df.loc[hero_names],
+            pinned_item_df=self.pinned_item_df[
+                self.pinned_item_df["pinned_hero"].isin(hero_names)
+            ],
+        )
+        opt.add_constraints(
+            hero_min_df=self.hero_min_df.loc[hero_names],
+            hero_max_df=self.hero_max_df.loc[hero_names],
+            set_constraints_df=self.set_constraints_df.loc[hero_names],
+        )
+        opt.set_objective_optimisation(
+            stat_weightings_df=self.stat_weightings_df.loc[hero_names]
+        )
+        opt.define_solver(timer=timer, worker_count=worker_count)
+
+        if equip_dict is not None:
+            local_ix = {hero: ix for ix, hero in enumerate(heroes)}
+            opt.set_solution_hint(
+                {
+                    (local_ix[hero], item): equipped
+                    for (hero, item), equipped in equip_dict.items()
+                    if hero in local_ix
+                }
+            )
+
+        response_dict = opt.run_solver()
+
+        if response_dict["equip_dict"] is not None:
+            response_dict["equip_dict"] = {
+                (heroes[hero], item): equipped
+                for (hero, item), equipped in response_dict[
+                    "equip_dict"
+                ].items()
+            }
+
+        return response_dict
+
+    def _run_parallel(self, jobs, timer, worker_count):
+        """Runs (heroes, items, equip_dict) jobs on a thread pool, splitting the workers between
+        them. Returns the response dictionaries in job order.
+        """
+
+        parallel_jobs = max(1, min(len(jobs), worker_count))
+        job_workers = max(1, worker_count // parallel_jobs)
+
+        # jobs that don't fit in parallel run in later waves, each wave gets an equal time share
+        job_timer = max(timer / math.ceil(len(jobs) / parallel_jobs), 1)
+
+        with ThreadPoolExecutor(max_workers=parallel_jobs) as executor:
+            return list(
+                executor.map(
+                    lambda job: self._solve_subproblem(
+                        *job, timer=job_timer, worker_count=job_workers
+                    ),
+                    jobs,
+                )
+            )
+
+    def _exchange_pairs(self) -> List[Tuple[int, int]]:
+        """Disjoint pairs of solved clusters, most similar demand first (skipping stale pairs)"""
+
+        hero_similarity = _get_similarity(self.demand_df.to_numpy())
+        similarity = np.array(
+            [
+                [
+                    hero_similarity[
+                        np.ix_(cluster_a.heroes, cluster_b.heroes)
+                    ].mean()
+                    for cluster_b in self.clusters
+                ]
+                for cluster_a in self.clusters
+            ]
+        )
+
+        candidates = sorted(
+            (
+                (a, b)
+                for a in range(len(self.clusters))
+                for b in range(a + 1, len(self.clusters))
+                if self.clusters[a].objective_value is not None
+                and self.clusters[b].objective_value is not None
+                and (a, b) not in self.stale_pairs
+            ),
+            key=lambda pair: -similarity[pair],
+        )
+
+        pairs, paired = [], set()
+        for a, b in candidates:
+            if a not in paired and b not in paired:
+                pairs.append((a, b))
+                paired.update((a, b))
+
+        return pairs
+
+    def run_solver(
+        self,
+        timer=60,
+        worker_count=8,
+        exchange_rounds=2,
+        exchange_time_share=0.5,
+    ) -> Dict:
+        """Solves all clusters and runs the pairwise exchanges.
+
+        Args:
+            timer (int, optional): total time limit in seconds. Defaults to 60.
+            worker_count (int, optional): search workers shared by the parallel solves. Defaults to 8.
+            exchange_rounds (int, optional): rounds of pairwise re-solves. Defaults to 2.
+            exchange_time_share (float, optional): part of the time used for exchanges. Defaults to 0.5.
+
+        Returns:
+            Dict: merged response dictionary including cluster_table and exchange_table
+        """
+
+        if len(self.clusters) == 1:
+            exchange_rounds = 0
+
+        # STAGE 1. independent clusters
+        cluster_timer = (
+            timer * (1 - exchange_time_share) if exchange_rounds else timer
+        )
+        responses = self._run_parallel(
+            [
+                (cluster.heroes, cluster.items, None)
+                for cluster in self.clusters
+            ],
+            timer=cluster_timer,
+            worker_count=worker_count,
+        )
+        for cluster, response_dict in zip(self.clusters, responses):
+            cluster.response_dict = response_dict
+
+        initial_objective = self._total_objective()
+
+        # STAGE 2. pairwise exchanges
+        exchange_summary = []
+        for exchange_round in range(exchange_rounds):
+            pairs = self._exchange_pairs()
+            if not pairs:
+                break
+
+            jobs = []
+            for a, b in pairs:
+                cluster_a, cluster_b = self.clusters[a], self.clusters[b]
+                jobs.append(
+                    (
+                        cluster_a.heroes + cluster_b.heroes,
+                        cluster_a.items.append(cluster_b.items),
+                        {
+                            **cluster_a.response_dict["equip_dict"],
+                            **cluster_b.response_dict["equip_dict"],
+                        },
+                    )
+                )
+
+            responses = self._run_parallel(
+                jobs,
+                timer=timer * exchange_time_share / exchange_rounds,
+                worker_count=worker_count,
+            )
+
+            for (a, b), response_dict in zip(pairs, responses):
+                exchange_summary.append(
+                    self._apply_exchange(
+                        exchange_round + 1, a, b, response_dict
+                    )
+                )
+
+        return self._generate_response(initial_objective, exchange_summary)
+
+    def _apply_exchange(self, exchange_round, a, b, response_dict) -> Dict:
+        """Keeps the re-solved assignment of a pair of clusters if it improves their objective"""
+
+        cluster_a, cluster_b = self.clusters[a], self.clusters[b]
+        before = cluster_a.objective_value + cluster_b.objective_value
+        after = (
+            response_dict["objective_value"]
+            if response_dict["equip_dict"] is not None
+            else None
+        )
+
+        summary = {
+            "Round": exchange_round,
+            "Clusters": (a + 1, b + 1),
+            "Status": response_dict["status"],
+            "Objective_Before": before,
+            "Objective_After": after,
+            "Items_Moved": 0,
+        }
+
+        if after is None or after <= before:
+            self.stale_pairs.add((a, b))
+            return summary
+
+        self.stale_pairs = {
+            pair for pair in self.stale_pairs if a not in pair and b not in pair
+        }
+
+        # worn items follow their wearer, unused ones stay in their previous budget
+        hero_cluster = {hero: a for hero in cluster_a.heroes}
+        hero_cluster.update({hero: b for hero in cluster_b.heroes})
+        new_budgets = {a: set(), b: set()}
+        worn = set()
+        for (hero, item), equipped in response_dict["equip_dict"].items():
+            if equipped and item in self.item_df.index:
+                new_budgets[hero_cluster[hero]].add(item)
+                worn.add(item)
+        for cluster_ix, cluster in [(a, cluster_a), (b, cluster_b)]:
+            new_budgets[cluster_ix].update(set(cluster.items) - worn)
+
+        summary["Items_Moved"] = len(new_budgets[a] - set(cluster_a.items))
+        summary["Items_Moved"] += len(new_budgets[b] - set(cluster_b.items))
+
+        for cluster_ix, cluster in [(a, cluster_a), (b, cluster_b)]:
+            cluster.items = self.item_df.index[
+                self.item_df.index.isin(new_budgets[cluster_ix])
+            ]
+            cluster.response_dict = {
+                **response_dict,
+                "equip_dict": {
+                    (hero, item): equipped
+                    for (hero, item), equipped in response_dict[
+                        "equip_dict"
+                    ].items()
+                    if hero in cluster.heroes
+                },
+                "stats_table": response_dict["stats_table"].loc[
+                    self.hero_base_df.index[cluster.heroes]
+                ],
+                # the objective is a sum over heroes, so it splits onto the clusters
+                "objective_value": self._hero_objective(
+                    response_dict["stats_table"], cluster.heroes
+                ),
+            }
+
+        return summary
+
+    def _hero_objective(self, stats_table, heroes):
+        """Objective of a subset of heroes given their stats (weighted sum, as in the optimizer)"""
+
+        hero_names = self.hero_base_df.index[heroes]
+        weights = (
+            self.stat_weightings_df.loc[hero_names]
+            .reindex(columns=STAT_LIST)
+            .fillna(0)
+        )
+        return int(
+            (
+                stats_table.loc[hero_names, STAT_LIST].to_numpy()
+                * np.rint(weights.to_numpy()).astype(np.int64)
+            ).sum()
+        )
+
+    def _total_objective(self):
+
+        values = [cluster.objective_value for cluster in self.clusters]
+        return None if None in values else sum(values)
+
+    def _generate_response(self, initial_objective, exchange_summary) -> Dict:
+        """Merges the cluster results into a single response dictionary"""
+
+        cluster_table = pd.DataFrame(
+            [
+                {
+                    "Cluster": cluster_ix + 1,
+                    "Heroes": list(self.hero_base_df.index[cluster.heroes]),
+                    "Items": len(cluster.items),
+                    "Status": cluster.response_dict["status"],
+                    "Objective": cluster.objective_value,
+                }
+                for cluster_ix, cluster in enumerate(self.clusters)
+            ]
+        )
+        exchange_table = pd.DataFrame(
+            exchange_summary,
+            columns=[
+                "Round",
+                "Clusters",
+                "Status",
+                "Objective_Before",
+                "Objective_After",
+                "Items_Moved",
+            ],
+        )
+
+        statuses = [
+            cluster.response_dict["status"] for cluster in self.clusters
+        ]
+        response_dict = {
+            "cluster_table": cluster_table,
+            "exchange_table": exchange_table,
+        }
+
+        if all(status in ["OPTIMAL", "FEASIBLE"] for status in statuses):
+
+            equip_dict = {
+                (hero, item): 0
+                for item in self.item_df.index.append(self.pinned_item_df.index)
+                for hero in range(len(self.hero_base_df))
+            }
+            for cluster in self.clusters:
+                equip_dict.update(cluster.response_dict["equip_dict"])
+
+            total_objective = self._total_objective()
+            improvement = (
+                (total_objective - initial_objective) / abs(initial_objective)
+                if initial_objective
+                else 0.0
+            )
+
+            response_dict["status"] = "FEASIBLE"
+            response_dict["message"] = (
+                f"Sub-optimal solution found by splitting the heroes into {len(self.clusters)} clusters "
+                f"(item exchanges between clusters improved the objective by {improvement:.1%})"
+            )
+            response_dict["stats_table"] = pd.concat(
+                [
+                    cluster.response_dict["stats_table"]
+                    for cluster in self.clusters
+                ]
+            ).loc[self.hero_base_df.index]
+            response_dict["equip_dict"] = equip_dict
+            response_dict["objective_value"] = total_objective
+
+        else:
+            failed = [
+                str(cluster_ix + 1)
+                for cluster_ix, status in enumerate(statuses)
+                if status not in ["OPTIMAL", "FEASIBLE"]
+            ]
+            # a cluster can run out of gear in its budget even if the full problem is feasible,
+            # so infeasibility isn't proven
+            response_dict["status"] = "UNKNOWN"
+            response_dict["message"] = (
+                f"No solution found for cluster(s) {', '.join(failed)} with their share of the gear. "
+                "Please try relaxing constraints, extending the search time or using larger clusters."
+            )
+            response_dict["stats_table"] = None
+            response_dict["equip_dict"] = None
+
+        print("\n" + response_dict["message"] + "\n")
+
+        return response_dict
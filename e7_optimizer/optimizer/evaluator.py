@@ -0,0 +1,212 @@
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from optimizer.data_structures import (
+    PERCENT_STAT_MAP,
+    SET_TYPE_STATS,
+    STAT_LIST,
+    ItemTypes,
+    SetTypes,
+)
+from optimizer.utils import Hero, Item
+
+
+def _get_set_bonus_matrix() -> np.ndarray:
+    """set bonus per active set, SetTypes x STAT_LIST (same bonuses as Hero.update_stats)"""
+
+    set_bonus_matrix = np.zeros((len(SetTypes), len(STAT_LIST)))
+    for set_ix, set_type in enumerate(SetTypes):
+        vals = SET_TYPE_STATS[set_type]
+        if "stat" in vals:
+            set_bonus_matrix[set_ix, STAT_LIST.index(vals["stat"])] = vals[
+                "stat_bonus"
+            ]
+
+    return set_bonus_matrix
+
+
+SET_BONUS_MATRIX = _get_set_bonus_matrix()
+SET_THRESHOLDS = np.array(
+    [SET_TYPE_STATS[set_type]["threshold"] for set_type in SetTypes]
+)
+
+
+def get_item_arrays(items: List[Item]) -> Tuple[np.ndarray, np.ndarray]:
+    """Converts item objects into the arrays used by evaluate_builds.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: item stats (items x STAT_LIST), set type value of each item
+    """
+
+    item_stats = np.array(
+        [[getattr(item.stats, stat) for stat in STAT_LIST] for item in items],
+        dtype=float,
+    ).reshape(len(items), len(STAT_LIST))
+    item_set_types = np.array([int(item.set_type) for item in items], dtype=int)
+
+    return item_stats, item_set_types
+
+
+def evaluate_builds(
+    build_items: np.ndarray,
+    item_stats: np.ndarray,
+    item_set_types: np.ndarray,
+    base_stats: np.ndarray,
+    base_with_additional_stats: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Calculates the final stats of many builds at once.
+
+    Follows the float arithmetic of Hero.update_stats step by step (same operations in the
+    same order), so the results are identical rather than just close:
+    base + additional stats, plus the item stats summed slot by slot, plus the set bonuses,
+    then percentage stats are applied as percent * 0.01 * base stat.
+
+    Args:
+        build_items (np.ndarray): builds x 6 item indices (slots in ItemTypes order), -1 for an empty slot
+        item_stats (np.ndarray): items x STAT_LIST (see get_item_arrays)
+        item_set_types (np.ndarray): set type value of each item
+        base_stats (np.ndarray): base stats of the hero of each build, builds x STAT_LIST (or a single row)
+        base_with_additional_stats (np.ndarray): base stats including additional stats (artifact etc.)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: stats (builds x STAT_LIST), active sets (builds x SetTypes)
+    """
+
+    build_items = np.asarray(build_items, dtype=int)
+    n_builds = build_items.shape[0]
+    empty = build_items < 0
+
+    # an empty slot adds 0, looked up as an extra row of zeros / no set
+    item_stats = np.vstack([item_stats, np.zeros((1, len(STAT_LIST)))])
+    item_set_types = np.append(item_set_types, 0)
+    build_items = np.where(empty, len(item_stats) - 1, build_items)
+
+    # item stats are summed slot by slot, then added onto the base stats
+    slot_stats = item_stats[build_items]
+    equipment_stats = slot_stats[:, 0]
+    for slot in range(1, len(ItemTypes)):
+        equipment_stats = equipment_stats + slot_stats[:, slot]
+
+    stats = (
+        np.broadcast_to(
+            np.asarray(base_with_additional_stats, dtype=float),
+            (n_builds, len(STAT_LIST)),
+        )
+        + equipment_stats
+    )
+
+    # active sets
+    build_set_types = item_set_types[build_items]
+    set_counts = np.stack(
+        [(build_set_types == set_type).sum(axis=1) for set_type in SetTypes],
+        axis=1,
+    )
+    active_sets = set_counts // SET_THRESHOLDS
+
+    stats = stats + active_sets @ SET_BONUS_MATRIX
+
+    # percentage multipliers
+    base_stats = np.broadcast_to(
+        np.asarray(base_stats, dtype=float), (n_builds, len(STAT_LIST))
+    )
+    for percent_stat, flat_stat in PERCENT_STAT_MAP.items():
+        percent_ix = STAT_LIST.index(percent_stat)
+        flat_ix = STAT_LIST.index(flat_stat)
+        stats[:, flat_ix] += (
+            stats[:, percent_ix] * 0.01 * base_stats[:, flat_ix]
+        )
+
+    return stats, active_sets
+
+
+def evaluate_heroes(heroes: List[Hero]) -> Tuple[np.ndarray, np.ndarray]:
+    """Evaluates the currently equipped gear of many heroes at once (e.g. a whole roster).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: stats (heroes x STAT_LIST), active sets (heroes x SetTypes)
+    """
+
+    items = []
+    build_items = np.full((len(heroes), len(ItemTypes)), -1)
+    for hero_ix, hero in enumerate(heroes):
+        for slot, item_type in enumerate(ItemTypes):
+            item = hero.equipment[item_type]
+            if item is not None:
+                build_items[hero_ix, slot] = len(items)
+                items.append(item)
+
+    item_stats, item_set_types = get_item_arrays(items)
+
+    # additional stat sources are summed in the same order as in Hero.update_stats
+    base_with_additional_stats = [
+        hero.base_stats
+        + hero.additional_stats
+        + hero.artifact
+        + hero.exclusive_equipment
+        + hero.imprint
+        for hero in heroes
+    ]
+
+    return evaluate_builds(
+        build_items,
+        item_stats,
+        item_set_types,
+        base_stats=_to_array([hero.base_stats for hero in heroes]),
+        base_with_additional_stats=_to_array(base_with_additional_stats),
+    )
+
+
+def _to_array(stat_sticks) -> np.ndarray:
+
+    return np.array(
+        [
+            [getattr(stat_stick, stat) for stat in STAT_LIST]
+            for stat_stick in stat_sticks
+        ],
+        dtype=float,
+    ).reshape(len(stat_sticks), len(STAT_LIST))
+
+
+def check_hero_parity(heroes: List[Hero]) -> pd.DataFrame:
+    """Compares evaluate_heroes against Hero.update_stats (bit for bit) for the given heroes.
+    Used to verify the evaluator, e.g. on a freshly loaded roster.
+
+    Returns:
+        pd.DataFrame: one row per mismatching stat or set, empty if all results are identical
+    """
+
+    stats, active_sets = evaluate_heroes(heroes)
+
+    mismatches = []
+    for hero_ix, hero in enumerate(heroes):
+        hero.update_stats()
+
+        for stat_ix, stat in enumerate(STAT_LIST):
+            expected = float(getattr(hero.equipped_stats, stat))
+            if stats[hero_ix, stat_ix] != expected:
+                mismatches.append(
+                    {
+                        "Hero": hero.name,
+                        "Value": stat,
+                        "Expected": expected,
+                        "Evaluated": stats[hero_ix, stat_ix],
+                    }
+                )
+
+        for set_ix, set_type in enumerate(SetTypes):
+            expected = hero.active_sets[set_type]
+            if active_sets[hero_ix, set_ix] != expected:
+                mismatches.append(
+                    {
+                        "Hero": hero.name,
+                        "Value": set_type.name,
+                        "Expected": expected,
+                        "Evaluated": active_sets[hero_ix, set_ix],
+                    }
+                )
+
+    return pd.DataFrame(
+        mismatches, columns=["Hero", "Value", "Expected", "Evaluated"]
+    )
@@ -0,0 +1,66 @@
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+def compact_objective(
+    coefficients: np.ndarray, max_coefficient: int = None
+) -> Tuple[np.ndarray, Dict]:
+    """Pre-processes the coefficients of a linear objective before it's given to the solver.
+
+    - All coefficients are divided by their greatest common divisor (no loss of precision).
+    - Optionally, they're rescaled so the largest coefficient is at most max_coefficient.
+      This rounds the coefficients, the resulting precision loss is reported.
+    - Zero terms (e.g. stats with no weight) are marked by 0 coefficients for the caller to drop.
+
+    Smaller, more even coefficients give the solver better bounds, making optimality easier to prove.
+    Only the direction of the objective matters, so the solution is unaffected by the GCD division.
+
+    Args:
+        coefficients (np.ndarray): integer coefficient of each term
+        max_coefficient (int, optional): largest coefficient after rescaling. Defaults to None (no rescaling).
+
+    Returns:
+        Tuple[np.ndarray, Dict]: compacted coefficients, summary of the pre-processing
+    """
+
+    coefficients = np.asarray(coefficients, dtype=np.int64)
+    nonzero = coefficients != 0
+
+    divisor = (
+        int(np.gcd.reduce(np.abs(coefficients[nonzero])))
+        if nonzero.any()
+        else 1
+    )
+    compacted = coefficients // divisor
+
+    scale = 1.0
+    max_abs_coefficient = int(np.abs(compacted).max()) if nonzero.any() else 0
+    if max_coefficient and max_abs_coefficient > max_coefficient:
+        scale = max_coefficient / max_abs_coefficient
+        compacted = np.rint(compacted * scale).astype(np.int64)
+
+    # relative error of the (rounded) coefficients compared to the exact rescaled ones
+    exact = coefficients[nonzero] / divisor * scale
+    max_relative_error = (
+        float(np.max(np.abs(compacted[nonzero] - exact) / np.abs(exact)))
+        if nonzero.any()
+        else 0.0
+    )
+
+    summary = {
+        "terms": int((compacted != 0).sum()),
+        "zero_terms_dropped": int((~nonzero).sum()),
+        "terms_rounded_to_zero": int((nonzero & (compacted == 0)).sum()),
+        "gcd": divisor,
+        "scale": scale,
+        "max_coefficient_before": int(np.abs(coefficients).max())
+        if len(coefficients)
+        else 0,
+        "max_coefficient_after": int(np.abs(compacted).max())
+        if len(compacted)
+        else 0,
+        "max_relative_error": max_relative_error,
+    }
+
+    return compacted, summary
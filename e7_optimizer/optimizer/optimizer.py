@@ -1,10 +1,27 @@
+import os
+
 import pandas as pd
+from optimizer.bounds import get_stat_bounds
+from optimizer.callbacks import (
+    CheckpointWriter,
+    EarlyStopping,
+    SolutionPool,
+    SolutionPrinter,
+)
+from optimizer.objective import compact_objective
+from optimizer.replay import save_bundle
+from optimizer.tuning import load_profile
 from optimizer.data_structures import (
+    COARSE_STAT_BUCKETS,
+    PERCENT_STAT_MAP,
     SET_TYPE_STATS,
+    SOLVER_PROFILE_PATH,
     STAT_LIST,
+    STAT_NORMALISATION_DICT,
     ItemTypes,
     SET_TYPE_STATS,
 )
+from ortools.sat import sat_parameters_pb2
 from ortools.sat.python import cp_model
 import numpy as np
 
@@ -18,143 +35,296 @@ class Optimizer:
         item_df: pd.DataFrame,
         hero_base_df: pd.DataFrame,
         hero_additional_df: pd.DataFrame,
+        pinned_item_df: pd.DataFrame = None,
     ):
-        self.item_df = self._convert_to_int(item_df)
+        # items are sorted by id, so the model doesn't depend on the order of the input table
+        self.item_df = self._convert_to_int(item_df).sort_index(kind="stable")
         self.hero_base_df = self._convert_to_int(hero_base_df)
         self.hero_additional_df = self._convert_to_int(hero_additional_df)
 
+        # items locked onto heroes (see data_handlers.get_optimizer_item_scope)
+        if pinned_item_df is None:
+            pinned_item_df = self.item_df.iloc[:0].assign(pinned_hero=None)
+        self.pinned_item_df = self._convert_to_int(pinned_item_df).sort_index(
+            kind="stable"
+        )
+
         # init generated attributes
-        self.hero_df_equip = self.hero_additional_df.copy()
+        # constant part of each hero's stats (additional stats + pinned items), heroes x STAT_LIST
+        self.hero_stat_constants = self.hero_additional_df[STAT_LIST].to_numpy(
+            dtype=np.int64, copy=True
+        )
         self.item_iterator = range(self.item_df.shape[0])
         self.hero_iterator = range(self.hero_base_df.shape[0])
 
+        # pinned items are constants rather than model variables
+        self._apply_pinned_items()
+
+        # group identical items so the model only needs one variable per hero and item class
+        self._create_item_classes()
+        self.class_iterator = range(self.class_df.shape[0])
+
+        # cheap bounds on the achievable stats of each hero, used to tighten constraints
+        self.stat_lower_bounds, self.stat_upper_bounds = get_stat_bounds(
+            pd.concat([self.item_df, self.pinned_item_df]),
+            self.hero_base_df,
+            self.hero_additional_df,
+        )
+
         # placeholder attributes
         self.model = None
         self.solver = None
+        self.deterministic = False
         self.equip_vars = None
         self.optimized_equip_dict = None
+        self.objective_summary = None
+        self.early_stopping = None
 
         ### Run initilisation methods
         self._create_model()
-        self._define_objective_function()
+        self._prepare_stat_expressions()
 
     def _convert_to_int(self, df):
-        """converts all numerical columns in a df to integers"""
+        """converts all numerical columns in a df to integers.
+        The input df is never modified (it may be shared session state or read-only),
+        tables that are already integer (see data_handlers.to_int_table) are used as is.
+        """
 
-        numeric_cols = df.select_dtypes(np.number).columns
-        df[numeric_cols] = df[numeric_cols].applymap(round)
+        float_cols = [
+            col
+            for col in df.select_dtypes(np.number).columns
+            if not pd.api.types.is_integer_dtype(df[col])
+        ]
 
-        return df
+        if not float_cols:
+            return df
 
-    def _create_model(self):
+        df = df.copy()
+        df[float_cols] = df[float_cols].applymap(round)
 
-        # create model
-        self.model = cp_model.CpModel()
+        return df
 
-        self.equip_vars = {
-            (hero, item): self.model.NewIntVar(0, 1, f"{hero}_{item}")
-            for item in self.item_iterator
+    def _apply_pinned_items(self):
+        """Adds the stats of items pinned to a hero onto the hero as constants,
+        and records the slots and set pieces they take up.
+        """
+
+        self.pinned_slots = {hero: set() for hero in self.hero_iterator}
+        self.pinned_set_counts = {
+            hero: dict.fromkeys(SET_TYPE_STATS.keys(), 0)
             for hero in self.hero_iterator
         }
 
-    def _define_objective_function(self):
+        for _, item in self.pinned_item_df.iterrows():
 
-        # mapping between stat modifiers and the stat they modify
-        multiplier_map = {
-            "DefensePercent": "Defense",
-            "HealthPercent": "Health",
-            "SpeedPercent": "Speed",
-            "AttackPercent": "Attack",
-        }
+            hero = self.hero_base_df.index.get_loc(item["pinned_hero"])
 
-        #######################
-        ### SET BONUS STATS ###
-        #######################
+            if item["item_type"] in self.pinned_slots[hero]:
+                raise ValueError(
+                    f"More than one item pinned to the {ItemTypes(item['item_type']).name} "
+                    f"slot of {item['pinned_hero']}"
+                )
+            self.pinned_slots[hero].add(item["item_type"])
+            if item["set_type"] in self.pinned_set_counts[hero]:
+                self.pinned_set_counts[hero][item["set_type"]] += 1
+
+            for stat_ix, stat in enumerate(STAT_LIST):
+                self.hero_stat_constants[hero, stat_ix] += item[stat]
+
+                # same percentage multiplier handling as for regular items
+                if stat in PERCENT_STAT_MAP:
+                    adj_stat = PERCENT_STAT_MAP[stat]
+                    self.hero_stat_constants[
+                        hero, STAT_LIST.index(adj_stat)
+                    ] += (
+                        item[stat] * int(self.hero_base_df[adj_stat].iloc[hero])
+                    ) // 100
 
-        for hero in self.hero_iterator:
-            for current_set_type, vals in SET_TYPE_STATS.items():
+    def _create_item_classes(self):
+        """Groups items which are indistinguishable to the optimizer (same slot, set and stats)
+        into equivalence classes. Without this every duplicate item gets its own variable per hero,
+        which creates a lot of symmetric solutions for the solver to work through.
 
-                # only run if the specific set_type gives a stat bonus (e.g. SetTypes.SPEED)
-                if "stat" in vals:
+        Generates:
+            item_class_ids: class index for each item (in item_df order)
+            class_members: item indices belonging to each class
+            class_df: one representative row per class with the class size
+        """
 
-                    # variable in model that stores the count of current set
-                    set_count = self.model.NewIntVar(
-                        0, len(self.item_iterator), f"{hero}_{current_set_type}"
-                    )
+        class_cols = ["item_type", "set_type"] + STAT_LIST
 
-                    # get the count of the current set type equipped
-                    tmp_lin = sum(
-                        [
-                            self.equip_vars[(hero, item)] * 1
-                            if self.item_df["set_type"].iloc[item]
-                            == current_set_type
-                            else 0
-                            for item in self.item_iterator
-                        ]
-                    )
+        # no free items (e.g. everything locked or excluded), so no classes either
+        if self.item_df.empty:
+            self.item_class_ids = np.zeros(0, dtype=int)
+            self.class_members = []
+            self.class_df = self.item_df.iloc[:0].reset_index(drop=True)
+            self.class_df["class_size"] = np.zeros(0, dtype=int)
+            return
 
-                    # assign the current set count to variable
-                    self.model.Add(set_count == tmp_lin)
+        self.item_class_ids = (
+            self.item_df.groupby(class_cols, sort=False, dropna=False)
+            .ngroup()
+            .values
+        )
 
-                    # determine how many sets are active (handled multiple counts for crit, hit, etc)
-                    active_set_counts = self.model.NewIntVar(
-                        0, 3, f"stat_bonus_{hero}"
-                    )
+        # split the (stably) sorted item indices into the members of each class
+        class_sizes = np.bincount(self.item_class_ids)
+        self.class_members = np.split(
+            np.argsort(self.item_class_ids, kind="stable"),
+            np.cumsum(class_sizes)[:-1],
+        )
 
-                    # dividing the count of each set (as an integer) by the relevant set threshold
-                    # 4 piece bonuses won't ever be more than 1, 2 piece can be upto 3
-                    # TODO: Maybe add some handling for limited 2 piece (e.g. penetration set)
-                    self.model.AddDivisionEquality(
-                        active_set_counts, set_count, vals["threshold"]
-                    )
+        self.class_df = self.item_df.iloc[
+            [members[0] for members in self.class_members]
+        ].reset_index(drop=True)
+        self.class_df["class_size"] = class_sizes
 
-                    stat_increase = active_set_counts * vals["stat_bonus"]
+    def _create_model(self):
 
-                    self.hero_df_equip[vals["stat"]].iloc[hero] += stat_increase
+        # create model
+        self.model = cp_model.CpModel()
 
-                    # add set bonus stats to regular stat (e.g. for AttackPercent)
-                    if vals["stat"] in multiplier_map.keys():
-                        adj_stat = multiplier_map[vals["stat"]]
+        # number of items from each class a hero takes
+        # a hero can only wear one item per slot so this never exceeds 1 for a single hero,
+        # the class size is enforced across heroes in add_constraints
+        # slots that are taken by a pinned item are fixed to 0
+        self.equip_vars = {
+            (hero, item_class): self.model.NewIntVar(
+                0,
+                int(
+                    self.class_df["item_type"].iloc[item_class]
+                    not in self.pinned_slots[hero]
+                ),
+                f"{hero}_{item_class}",
+            )
+            for item_class in self.class_iterator
+            for hero in self.hero_iterator
+        }
 
-                        # calculate the stat adjustment for a single 'bonus'
-                        single_bonus_adj_stat = (
-                            vals["stat_bonus"]
-                            * int(self.hero_base_df[adj_stat].iloc[hero])
-                        ) // 100
+    def _prepare_stat_expressions(self):
+        """Sets up the lookups used to build the stat expressions of each hero.
 
-                        # calculate total bonus based on active count (opt param)
-                        total_bonus = active_set_counts * single_bonus_adj_stat
+        Expressions are only built for the stats a run actually uses (stats with a weight
+        or a constraint that isn't already met by the stat bounds), along with the set bonus
+        variables those stats depend on. Typically only a few of the stats are relevant per hero,
+        which keeps the model a lot smaller. The full stat table is computed from the item
+        assignment after solving (see _generate_output_stats_table).
+        """
 
-                        # add total bonus to existing stat
-                        self.hero_df_equip[adj_stat].iloc[hero] += total_bonus
+        # mapping between stat modifiers and the stat they modify
+        multiplier_map = PERCENT_STAT_MAP
 
-        ##################
-        ### ITEM STATS ###
-        ##################
+        class_stats = self.class_df[STAT_LIST].to_numpy(dtype=np.int64)
+        base_stats = self.hero_base_df[STAT_LIST].to_numpy(dtype=np.int64)
 
-        # calculate the components in the objective function -> stats if items are equiped
-        for hero, item in self.equip_vars.keys():
-            for stat in STAT_LIST:
+        # stat each item class gives each hero -> heroes x classes x stats
+        # adjustment for stat multipliers -> e.g. AttackPercent should increase the Attack based on hero stats
+        self.class_stat_values = np.repeat(
+            class_stats[None, :, :], len(self.hero_iterator), axis=0
+        )
+        for stat, adj_stat in multiplier_map.items():
+            stat_ix = STAT_LIST.index(stat)
+            adj_ix = STAT_LIST.index(adj_stat)
+            self.class_stat_values[:, :, adj_ix] += (
+                class_stats[None, :, stat_ix] * base_stats[:, adj_ix, None]
+            ) // 100
+
+        # set bonus each active set gives each hero -> {set_type: heroes x stats}
+        self.set_bonus_values = {}
+        for set_type, vals in SET_TYPE_STATS.items():
+
+            # only if the specific set_type gives a stat bonus (e.g. SetTypes.SPEED)
+            if "stat" not in vals:
+                continue
+
+            bonus = np.zeros_like(base_stats)
+            bonus[:, STAT_LIST.index(vals["stat"])] = vals["stat_bonus"]
+
+            # add set bonus stats to regular stat (e.g. for AttackPercent)
+            if vals["stat"] in multiplier_map:
+                adj_ix = STAT_LIST.index(multiplier_map[vals["stat"]])
+                bonus[:, adj_ix] = (
+                    vals["stat_bonus"] * base_stats[:, adj_ix]
+                ) // 100
+
+            self.set_bonus_values[set_type] = bonus
+
+        self.class_set_types = self.class_df["set_type"].to_numpy()
+
+        # built on demand
+        self.stat_expressions = {}
+        self.active_set_vars = {}
+
+    def _get_stat_expression(self, hero, stat):
+        """Linear expression for the stat of a hero (built once, on first use)"""
+
+        if (hero, stat) not in self.stat_expressions:
+
+            stat_ix = STAT_LIST.index(stat)
+
+            # stats from equipment (only item classes that give the stat)
+            class_values = self.class_stat_values[hero, :, stat_ix]
+            terms = [
+                self.equip_vars[(hero, item_class)]
+                * int(class_values[item_class])
+                for item_class in np.flatnonzero(class_values)
+            ]
+
+            # stats from active set bonuses
+            for set_type, bonus in self.set_bonus_values.items():
+                if bonus[hero, stat_ix]:
+                    terms.append(
+                        self._get_active_set_var(hero, set_type)
+                        * int(bonus[hero, stat_ix])
+                    )
 
-                stat_val = self.item_df[stat].iloc[item]
+            self.stat_expressions[(hero, stat)] = cp_model.LinearExpr.Sum(
+                terms
+            ) + int(self.hero_stat_constants[hero, stat_ix])
 
-                # adjustment for stat multipliers -> e.g. AttackPercent should increase the Attack based on hero stats
-                if stat in multiplier_map.keys():
-                    adj_stat = multiplier_map[stat]
+        return self.stat_expressions[(hero, stat)]
 
-                    mult = (
-                        stat_val * int(self.hero_base_df[adj_stat].iloc[hero])
-                    ) // 100
+    def _get_active_set_var(self, hero, set_type):
+        """Variable for the number of active bonuses of a set for a hero (built once, on first use)"""
+
+        if (hero, set_type) not in self.active_set_vars:
 
-                    used_item_mult = self.equip_vars[(hero, item)] * mult
+            vals = SET_TYPE_STATS[set_type]
 
-                    # update stat with multiplier value
-                    self.hero_df_equip[adj_stat].iloc[hero] += used_item_mult
+            # variable in model that stores the count of current set
+            set_count = self.model.NewIntVar(
+                0, len(ItemTypes), f"{hero}_{set_type}"
+            )
 
-                # update stat with equipment value (in all cases)
-                self.hero_df_equip[stat].iloc[hero] += (
-                    stat_val * self.equip_vars[(hero, item)]
+            # assign the current set count to variable (including pinned pieces)
+            self.model.Add(
+                set_count
+                == cp_model.LinearExpr.Sum(
+                    [
+                        self.equip_vars[(hero, item_class)]
+                        for item_class in np.flatnonzero(
+                            self.class_set_types == set_type
+                        )
+                    ]
                 )
+                + self.pinned_set_counts[hero][set_type]
+            )
+
+            # determine how many sets are active (handled multiple counts for crit, hit, etc)
+            active_set_counts = self.model.NewIntVar(
+                0, 3, f"stat_bonus_{hero}_{set_type}"
+            )
+
+            # dividing the count of each set (as an integer) by the relevant set threshold
+            # 4 piece bonuses won't ever be more than 1, 2 piece can be upto 3
+            # TODO: Maybe add some handling for limited 2 piece (e.g. penetration set)
+            self.model.AddDivisionEquality(
+                active_set_counts, set_count, vals["threshold"]
+            )
+
+            self.active_set_vars[(hero, set_type)] = active_set_counts
+
+        return self.active_set_vars[(hero, set_type)]
 
     def add_constraints(self, hero_min_df, hero_max_df, set_constraints_df):
         """Add constraints to the model.
@@ -166,15 +336,18 @@ class Optimizer:
         hero_min_df = self._convert_to_int(hero_min_df)
         hero_max_df = self._convert_to_int(hero_max_df)
 
+        # kept to rebuild the constraints on other models (e.g. coarse-to-fine solving)
+        self.constraint_inputs = (hero_min_df, hero_max_df, set_constraints_df)
+
         # CONDITION 1. Only one type of item per hero (e.g. 1 ring, 1 boots)
         for hero in self.hero_iterator:
             for item_type in ItemTypes:
                 self.model.Add(
                     sum(
                         [
-                            self.equip_vars[(hero, item_iter)]
-                            for item_iter in self.item_iterator
-                            if self.item_df.iloc[item_iter]["item_type"]
+                            self.equip_vars[(hero, class_iter)]
+                            for class_iter in self.class_iterator
+                            if self.class_df.iloc[class_iter]["item_type"]
                             == item_type
                         ]
                     )
@@ -182,27 +355,44 @@ class Optimizer:
                 )
 
         # CONDITION 2. An item cannot be equipped by more than one hero
-        for item in self.item_iterator:
+        # -> items of a class can't be handed out more times than there are copies
+        for item_class in self.class_iterator:
             self.model.Add(
                 sum(
                     [
-                        self.equip_vars[(hero_iter, item)]
+                        self.equip_vars[(hero_iter, item_class)]
                         for hero_iter in self.hero_iterator
                     ]
                 )
-                <= 1
+                <= int(self.class_df["class_size"].iloc[item_class])
             )
 
+        # user constraints are recorded so infeasible runs can be explained
+        self.user_constraints = []
+
         # CONDITION 3. Net hero stats must be within the user defined ranges (min and max values)
+        # min and max are separate constraints, which are skipped if the stat bounds already satisfy them
         for hero in self.hero_iterator:
             for stat in STAT_LIST:
-                self.model.AddLinearExpressionInDomain(
-                    self.hero_df_equip.iloc[hero][stat],
-                    cp_model.Domain(
-                        int(hero_min_df.iloc[hero][stat]),
-                        int(hero_max_df.iloc[hero][stat]),
-                    ),
-                )
+
+                stat_min = int(hero_min_df.iloc[hero][stat])
+                stat_max = int(hero_max_df.iloc[hero][stat])
+
+                if stat_min > self.stat_lower_bounds.iloc[hero][stat]:
+                    self._add_user_constraint(
+                        self._get_stat_expression(hero, stat) >= stat_min,
+                        hero,
+                        f"{stat} minimum",
+                        stat_min,
+                    )
+
+                if stat_max < self.stat_upper_bounds.iloc[hero][stat]:
+                    self._add_user_constraint(
+                        self._get_stat_expression(hero, stat) <= stat_max,
+                        hero,
+                        f"{stat} maximum",
+                        stat_max,
+                    )
 
         # CONDITION 4. Heroes must have at least 1 active count per user defined set constraint
         for hero in self.hero_iterator:
@@ -210,58 +400,1010 @@ class Optimizer:
             if ~pd.isnull(set_constraints_df.iloc[hero])[0]:
                 for desired_set_type in set_constraints_df.iloc[hero][0]:
 
-                    self.model.Add(
+                    self._add_user_constraint(
                         sum(
                             [
-                                self.equip_vars[(hero, item_iter)]
-                                for item_iter in self.item_iterator
-                                if self.item_df.iloc[item_iter]["set_type"]
+                                self.equip_vars[(hero, class_iter)]
+                                for class_iter in self.class_iterator
+                                if self.class_df.iloc[class_iter]["set_type"]
                                 == desired_set_type
                             ]
                         )
-                        >= SET_TYPE_STATS[desired_set_type]["threshold"]
+                        + self.pinned_set_counts[hero].get(desired_set_type, 0)
+                        >= SET_TYPE_STATS[desired_set_type]["threshold"],
+                        hero,
+                        f"{desired_set_type.name} set",
+                        SET_TYPE_STATS[desired_set_type]["threshold"],
                     )
 
-    def set_objective_optimisation(self, stat_weightings_df=None):
-        """Sets the objective function to be maximized. Janky arguments to be fixed"""
+    def _add_user_constraint(self, bounded_expr, hero, constraint_name, limit):
+        """Adds a user defined constraint to the model and records it for infeasibility explanations"""
+
+        self.user_constraints.append(
+            {
+                "Hero": self.hero_base_df.index[hero],
+                "Constraint": constraint_name,
+                "Limit": limit,
+                "constraint": self.model.Add(bounded_expr),
+            }
+        )
+
+    def set_objective_optimisation(
+        self, stat_weightings_df=None, max_objective_coefficient=None
+    ):
+        """Sets the objective function to be maximized. Janky arguments to be fixed
+
+        The objective is built as explicit coefficients per variable, which are compacted
+        before being given to the solver (see objective.compact_objective).
+        Objective values are always reported in the original (uncompacted) units.
+
+        Args:
+            stat_weightings_df (pd.DataFrame, optional): weight per hero and stat. Defaults to None (all 1).
+            max_objective_coefficient (int, optional): rescale the objective coefficients to at most this value,
+                at the cost of some precision. Defaults to None.
+        """
 
         if stat_weightings_df is not None:
-            self.model.Maximize(
-                (
-                    self.hero_df_equip[stat_weightings_df.columns]
-                    * stat_weightings_df
-                )
-                .sum()
-                .sum()
-            )
+            # integer weights keep the per hero objectives usable as constraints
+            stat_weightings_df = self._convert_to_int(stat_weightings_df)
         else:
-            self.model.Maximize(
-                self.hero_df_equip[stat_weightings_df.columns].sum().sum()
+            stat_weightings_df = pd.DataFrame(
+                1, index=self.hero_base_df.index, columns=STAT_LIST
             )
 
-    def define_solver(self, timer=60, worker_count=8):
+        self.objective_inputs = (stat_weightings_df, max_objective_coefficient)
+
+        self.stat_weights = (
+            stat_weightings_df.reindex(columns=STAT_LIST)
+            .fillna(0)
+            .to_numpy(dtype=np.int64)
+        )
+        self.max_objective_coefficient = max_objective_coefficient
+
+        # objective terms of each hero as (variables, coefficients, constant)
+        # percentage stats are already folded into the flat stats, so each equip/set variable gets one
+        # coefficient summed over the weighted stats. Stats without a weight are left out.
+        self.hero_objective_terms = []
+        for hero in self.hero_iterator:
+            weights = self.stat_weights[hero]
+
+            class_coefs = self.class_stat_values[hero] @ weights
+            variables = [
+                self.equip_vars[(hero, item_class)]
+                for item_class in self.class_iterator
+            ]
+            coefs = list(class_coefs)
+
+            for set_type, bonus in self.set_bonus_values.items():
+                set_coef = bonus[hero] @ weights
+                if set_coef:
+                    variables.append(self._get_active_set_var(hero, set_type))
+                    coefs.append(set_coef)
+
+            constant = int(self.hero_stat_constants[hero] @ weights)
+
+            self.hero_objective_terms.append(
+                (variables, np.array(coefs, dtype=np.int64), constant)
+            )
+
+        # objective contribution of each hero, kept separately for tiered optimisation
+        self.hero_objectives = [
+            cp_model.LinearExpr.Sum(
+                [
+                    var * int(coef)
+                    for var, coef in zip(variables, coefs)
+                    if coef != 0
+                ]
+            )
+            + constant
+            for variables, coefs, constant in self.hero_objective_terms
+        ]
+
+        self.objective_summary = self._maximize(self.hero_iterator)
+
+    def _maximize(self, heroes):
+        """Maximizes the combined objective of the given heroes, after compacting the coefficients.
+        Returns the summary of the compaction.
+        """
+
+        variables = [
+            var for hero in heroes for var in self.hero_objective_terms[hero][0]
+        ]
+        coefs = np.concatenate(
+            [self.hero_objective_terms[hero][1] for hero in heroes]
+            + [np.zeros(0, dtype=np.int64)]
+        )
+
+        compacted, summary = compact_objective(
+            coefs, self.max_objective_coefficient
+        )
+
+        # constants don't change the solution, so they're left out as well
+        # solver objective values are converted back with value * factor + constant
+        self.solver_objective_units = (
+            summary["gcd"] / summary["scale"],
+            sum(self.hero_objective_terms[hero][2] for hero in heroes),
+        )
+        self.model.Maximize(
+            cp_model.LinearExpr.Sum(
+                [
+                    var * int(coef)
+                    for var, coef in zip(variables, compacted)
+                    if coef != 0
+                ]
+            )
+        )
+
+        return summary
+
+    def _to_objective_units(self, solver_value):
+        """Converts a (compacted) solver objective value or bound into the original units,
+        approximate if the objective is rescaled
+        """
+
+        factor, constant = self.solver_objective_units
+
+        return solver_value * factor + constant
+
+    def _evaluate_objective(self, heroes=None, value=None):
+        """Objective value of the current solution in the original units.
+        value looks up variable values, defaults to the solver (e.g. a solution callback instead)
+        """
+
+        heroes = self.hero_iterator if heroes is None else heroes
+        value = self.solver.Value if value is None else value
+
+        return sum(
+            sum(
+                int(coef) * value(var)
+                for var, coef in zip(variables, coefs)
+                if coef != 0
+            )
+            + constant
+            for variables, coefs, constant in (
+                self.hero_objective_terms[hero] for hero in heroes
+            )
+        )
+
+    def _generate_objective_table(self):
+        """Effective stat weights per hero after the objective compaction"""
+
+        summary = self.objective_summary
+
+        objective_df = pd.DataFrame(
+            self.stat_weights / summary["gcd"] * summary["scale"],
+            index=self.hero_base_df.index,
+            columns=STAT_LIST,
+        ).round(4)
+
+        return objective_df.loc[:, (objective_df != 0).any(axis=0)]
+
+    def define_solver(
+        self,
+        timer=60,
+        worker_count=None,
+        profile_path=SOLVER_PROFILE_PATH,
+        deterministic=False,
+        random_seed=0,
+    ):
+        """Creates the solver. Tuned parameters for the size of the model are loaded from
+        the profile file if there is one (see optimizer/tuning.py).
+
+        In deterministic mode the same inputs always give the same result, which is what
+        benchmarks and regression checks need: the workers search interleaved (rather than racing
+        each other), the random seed is fixed and timer is a deterministic time limit.
+        Deterministic time roughly tracks seconds, but doesn't depend on the load of the machine.
+        There is no wall clock limit in this mode.
+
+        Args:
+            timer (int, optional): time limit in seconds. Defaults to 60.
+            worker_count (int, optional): search workers. Defaults to None (number of cpu cores).
+            profile_path (str, optional): solver profile file, None to use the default parameters.
+                Defaults to SOLVER_PROFILE_PATH.
+            deterministic (bool, optional): reproducible solves. Defaults to False.
+            random_seed (int, optional): solver seed in deterministic mode. Defaults to 0.
+        """
 
         self.solver = cp_model.CpSolver()
-        self.solver.parameters.num_search_workers = worker_count
-        self.solver.parameters.max_time_in_seconds = timer
+        self.solver.parameters.num_search_workers = (
+            worker_count or os.cpu_count() or 1
+        )
+
+        self.solver_profile = load_profile(len(self.equip_vars), profile_path)
+        for name, value in self.solver_profile.items():
+            setattr(self.solver.parameters, name, value)
+
+        self.deterministic = deterministic
+        if deterministic:
+            self.solver.parameters.random_seed = random_seed
+            self.solver.parameters.interleave_search = True
+
+        self.time_limit = timer
+
+        self.solution_printer = SolutionPrinter()
+
+    def set_early_stopping(
+        self, relative_gap=None, absolute_gap=None, stall_time=None
+    ):
+        """Stops searches once the solution is close enough to the best bound, or hasn't improved
+        for a while (see callbacks.EarlyStopping). Gaps are in the original objective units.
+        The response then says which criterion stopped the search.
+
+        Args:
+            relative_gap (float, optional): e.g. 0.001 to stop within 0.1% of the bound. Defaults to None.
+            absolute_gap (float, optional): stop within this objective value of the bound. Defaults to None.
+            stall_time (float, optional): seconds without a better solution. Defaults to None.
+        """
+
+        if relative_gap is None and absolute_gap is None and not stall_time:
+            self.early_stopping = None
+            return
+
+        self.early_stopping = EarlyStopping(
+            relative_gap=relative_gap,
+            absolute_gap=absolute_gap,
+            stall_time=stall_time,
+            objective_units=self._to_objective_units,
+        )
+
+    @property
+    def time_limit(self):
+        """Solver time limit, deterministic time in deterministic mode and seconds otherwise"""
 
-        self.solution_printer = cp_model.ObjectiveSolutionPrinter()
+        if self.deterministic:
+            return self.solver.parameters.max_deterministic_time
 
-    def run_solver(self):
+        return self.solver.parameters.max_time_in_seconds
+
+    @time_limit.setter
+    def time_limit(self, value):
+
+        self._set_time_limit(self.solver, value)
+
+    def _set_time_limit(self, solver, value):
+        """Sets the time limit of a solver, in the units of time_limit"""
+
+        if self.deterministic:
+            solver.parameters.max_deterministic_time = value
+        else:
+            solver.parameters.max_time_in_seconds = value
+
+    def _get_solve_time(self, solver=None):
+        """Time used by the last solve, in the units of the time limit"""
+
+        solver = self.solver if solver is None else solver
+
+        if self.deterministic:
+            return solver.ResponseProto().deterministic_time
+
+        return solver.WallTime()
+
+    def run_solver(
+        self,
+        coarse_to_fine=False,
+        candidates_per_slot=20,
+        n_solutions=1,
+        min_item_difference=2,
+        two_phase=False,
+        feasibility_time_share=0.5,
+    ):
+        """Runs the solver and returns the response dictionary.
+
+        Args:
+            coarse_to_fine (bool, optional): solve a coarse model first and refine its solution
+                (see _run_coarse_to_fine). Defaults to False.
+            candidates_per_slot (int, optional): item classes kept per hero and slot in coarse-to-fine mode.
+                Defaults to 20.
+            n_solutions (int, optional): number of distinct solutions to return (see _run_alternatives).
+                Defaults to 1.
+            min_item_difference (int, optional): items each alternative must change compared to
+                every previous solution. Defaults to 2.
+            two_phase (bool, optional): find any feasible solution before optimizing
+                (see _run_two_phase). Defaults to False.
+            feasibility_time_share (float, optional): maximum share of the time limit for the
+                feasibility phase, which stops at its first solution. Defaults to 0.5.
+        """
+
+        if coarse_to_fine:
+            return self._run_coarse_to_fine(candidates_per_slot)
+
+        if n_solutions > 1:
+            return self._run_alternatives(n_solutions, min_item_difference)
+
+        if two_phase:
+            return self._run_two_phase(feasibility_time_share)
 
         # run the solver
+        status = self._solve()
+
+        response_dict = self._generate_response(status)
+
+        print("\n" + response_dict["message"] + "\n")
+
+        return response_dict
+
+    def _run_coarse_to_fine(self, candidates_per_slot, coarse_time_share=0.3):
+        """Two stage solve for large groups of heroes, where finding a good solution
+        for the full model can take up the whole time budget.
+
+        1. A coarse model with bucketed item stats (see COARSE_STAT_BUCKETS) and only the best
+           candidate items per hero and slot is solved with part of the time budget.
+           Bucketing makes more items identical, so there are far fewer item classes.
+        2. The exact model, restricted to the same candidates, is solved from the coarse solution.
+           If the restricted model has no solution, the full exact model is solved instead.
+
+        As the exact stage only searches near the coarse solution, the result is at best FEASIBLE.
+        """
+
+        total_time = self.time_limit
+        candidates = self._get_candidate_classes(candidates_per_slot)
+
+        candidate_items = {
+            hero: set(
+                self.item_df.index[
+                    np.concatenate(
+                        [self.class_members[c] for c in hero_candidates]
+                        + [np.zeros(0, dtype=int)]
+                    )
+                ]
+            )
+            for hero, hero_candidates in candidates.items()
+        }
+
+        # STAGE 1. coarse model on the candidate items
+        coarse = Optimizer(
+            item_df=self._bucket_item_stats(
+                self.item_df.loc[
+                    self.item_df.index.isin(
+                        set().union(*candidate_items.values())
+                    )
+                ]
+            ),
+            hero_base_df=self.hero_base_df,
+            hero_additional_df=self.hero_additional_df,
+            pinned_item_df=self.pinned_item_df,
+        )
+        for (hero, item_class), var in coarse.equip_vars.items():
+            members = coarse.item_df.index[coarse.class_members[item_class]]
+            if candidate_items[hero].isdisjoint(members):
+                coarse.model.Add(var == 0)
+
+        coarse.add_constraints(*self.constraint_inputs)
+        coarse.set_objective_optimisation(*self.objective_inputs)
+        coarse.define_solver(
+            timer=total_time * coarse_time_share,
+            worker_count=self.solver.parameters.num_search_workers,
+            deterministic=self.deterministic,
+            random_seed=self.solver.parameters.random_seed,
+        )
+        coarse_status = coarse._solve()
+
+        stage_summary = [
+            {
+                "Stage": "coarse",
+                "Status": coarse.solver.StatusName(coarse_status),
+                "Item_Classes": len(coarse.class_df),
+                "Time": round(self._get_solve_time(coarse.solver), 2),
+            }
+        ]
+
+        # STAGE 2. exact model restricted to the candidates, warm started from the coarse solution
+        exact_model = self.model
+        self.model = cp_model.CpModel()
+        self.model.Proto().CopyFrom(exact_model.Proto())
+
+        if coarse_status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+            coarse_equip_dict = coarse._generate_equip_dict()
+            self.set_solution_hint(coarse_equip_dict)
+
+            # the coarse solution itself has to stay reachable
+            item_classes = dict(zip(self.item_df.index, self.item_class_ids))
+            for (hero, item), equipped in coarse_equip_dict.items():
+                if equipped and item in item_classes:
+                    candidates[hero].add(item_classes[item])
+
+        for (hero, item_class), var in self.equip_vars.items():
+            if item_class not in candidates[hero]:
+                self.model.Add(var == 0)
+
+        self.time_limit = max(
+            total_time - self._get_solve_time(coarse.solver), 1
+        )
+        status = self._solve()
+        self.model = exact_model
+
+        stage_summary.append(
+            {
+                "Stage": "exact (candidates only)",
+                "Status": self.solver.StatusName(status),
+                "Item_Classes": len(set().union(*candidates.values())),
+                "Time": round(self._get_solve_time(), 2),
+            }
+        )
+
+        # fall back onto the full model with whatever time is left
+        if status not in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+            self.time_limit = max(
+                total_time
+                - self._get_solve_time(coarse.solver)
+                - self._get_solve_time(),
+                1,
+            )
+            status = self._solve()
+            stage_summary.append(
+                {
+                    "Stage": "exact (full)",
+                    "Status": self.solver.StatusName(status),
+                    "Item_Classes": len(self.class_df),
+                    "Time": round(self._get_solve_time(), 2),
+                }
+            )
+        elif status == cp_model.OPTIMAL:
+            status = cp_model.FEASIBLE
+
+        self.time_limit = total_time
+
+        response_dict = self._generate_response(status)
+        response_dict["stage_table"] = pd.DataFrame(stage_summary)
+        if stage_summary[-1]["Stage"] == "exact (candidates only)":
+            response_dict[
+                "message"
+            ] += " (exact stage limited to the best candidate items)"
+
+        print("\n" + response_dict["message"] + "\n")
+
+        return response_dict
+
+    def _run_two_phase(self, feasibility_time_share):
+        """Two phase solve for tight constraints, where the solver can spend the whole time budget
+        optimizing without ever finding a solution that meets the constraints.
+
+        1. The model without its objective is solved, stopping at the first solution,
+           within part of the time budget.
+           If this phase finds the model infeasible or runs out of time, that's reported right away.
+           Stopping at the first solution is the only feasibility setting: quick restart branching
+           or switching off the LP relaxation didn't find a first solution any faster on tight stat
+           constraints (or-tools 9.2 has no feasibility jump workers).
+        2. The full model is optimized with the rest of the time, starting from that solution.
+        """
+
+        total_time = self.time_limit
+        parameters = sat_parameters_pb2.SatParameters()
+        parameters.CopyFrom(self.solver.parameters)
+
+        # PHASE 1. any solution meeting the constraints, on a copy of the model without the objective
+        model = self.model
+        self.model = cp_model.CpModel()
+        self.model.Proto().CopyFrom(model.Proto())
+        self.model.Proto().ClearField("objective")
+
+        self.solver.parameters.stop_after_first_solution = True
+        self.time_limit = total_time * feasibility_time_share
+
+        status = self.solver.Solve(self.model)
+        feasibility_time = self._get_solve_time()
+
+        stage_summary = [
+            {
+                "Stage": "feasibility",
+                "Status": self.solver.StatusName(status),
+                "Time": round(self._get_solve_time(), 2),
+            }
+        ]
+
+        self.model = model
+        self.solver.parameters.CopyFrom(parameters)
+
+        if status not in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+            response_dict = self._generate_response(status)
+            if status != cp_model.INFEASIBLE:
+                response_dict["message"] = (
+                    "No solution meeting the constraints was found within the feasibility phase "
+                    f"({feasibility_time:.0f}s). Please try extending the search time or relaxing constraints."
+                )
+            response_dict["stage_table"] = pd.DataFrame(stage_summary)
+
+            print("\n" + response_dict["message"] + "\n")
+
+            return response_dict
+
+        # PHASE 2. optimization from the feasible solution
+        self._set_solution_hint(
+            {var: self.solver.Value(var) for var in self.equip_vars.values()}
+        )
+        self.time_limit = max(total_time - feasibility_time, 1)
+        status = self._solve()
+        self.time_limit = total_time
+
+        stage_summary.append(
+            {
+                "Stage": "optimization",
+                "Status": self.solver.StatusName(status),
+                "Time": round(self._get_solve_time(), 2),
+            }
+        )
+
+        response_dict = self._generate_response(status)
+        response_dict["stage_table"] = pd.DataFrame(stage_summary)
+
+        print("\n" + response_dict["message"] + "\n")
+
+        return response_dict
+
+    def _run_alternatives(self, n_solutions, min_item_difference):
+        """Finds the best solution along with up to n_solutions - 1 distinct alternatives in one session.
+
+        After each search a no-good cut is added, so the next solution has to differ from every
+        previous one in at least min_item_difference equipped items (at most all of its items). Every solution found during
+        search is kept in a pool. The next search starts from the best pooled solution
+        that already satisfies the cuts (or the previous solution if there is none).
+        The solver time is split equally between the searches, solutions are returned best first.
+        Early stopping applies to every search, a checkpoint (see enable_checkpointing) to the first.
+
+        Returns:
+            Dict: response dictionary of the best solution, with the alternatives (each a response
+                dictionary with its gap to the best objective) and a summary table
+        """
+
+        equip_vars = list(self.equip_vars.values())
+        solution_printer = self.solution_printer
+        self.solution_printer = SolutionPool(
+            equip_vars,
+            checkpoint=solution_printer
+            if isinstance(solution_printer, CheckpointWriter)
+            else None,
+        )
+        self.time_limit /= n_solutions
+
+        # the cuts are added to a copy so the optimizer's own model is unchanged
+        exact_model = self.model
+        self.model = cp_model.CpModel()
+        self.model.Proto().CopyFrom(exact_model.Proto())
+
+        responses = []
+        previous_solutions = []
+
+        for _ in range(n_solutions):
+
+            if previous_solutions:
+                previous = previous_solutions[-1]
+                equipped = [
+                    var for var, value in zip(equip_vars, previous) if value
+                ]
+                # a solution can't lose more items than it equips, nothing to change if it equips none
+                if not equipped:
+                    break
+                self.model.Add(
+                    cp_model.LinearExpr.Sum(equipped)
+                    <= len(equipped) - min(min_item_difference, len(equipped))
+                )
+                self._set_solution_hint(
+                    dict(
+                        zip(
+                            equip_vars,
+                            self._best_pooled_solution(
+                                previous_solutions, min_item_difference
+                            ),
+                        )
+                    )
+                )
+
+            status = self._solve()
+            if status not in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+                if not responses:
+                    responses.append(self._generate_response(status))
+                break
+
+            previous_solutions.append(
+                tuple(self.solver.Value(var) for var in equip_vars)
+            )
+            responses.append(self._generate_response(status))
+
+            # the checkpoint keeps the best solution, later searches only look for alternatives
+            self.solution_printer.checkpoint = None
+
+        self.model = exact_model
+        self.solution_printer = solution_printer
+        self.time_limit *= n_solutions
+
+        # later searches can beat earlier ones if those didn't reach optimality
+        if len(responses) > 1:
+            responses.sort(
+                key=lambda response: response["objective_value"], reverse=True
+            )
+
+        response_dict = responses[0]
+        if len(responses) > 1:
+            best_objective = response_dict["objective_value"]
+            for alternative in responses[1:]:
+                alternative["gap"] = (
+                    best_objective - alternative["objective_value"]
+                ) / max(abs(best_objective), 1)
+
+            response_dict["alternatives"] = responses[1:]
+            response_dict["alternatives_table"] = pd.DataFrame(
+                [
+                    {
+                        "Solution": solution_ix + 1,
+                        "Status": response["status"],
+                        "Objective": response["objective_value"],
+                        "Gap": response.get("gap", 0.0),
+                        "Items_Changed": self._count_changed_items(
+                            response_dict["equip_dict"], response["equip_dict"]
+                        ),
+                    }
+                    for solution_ix, response in enumerate(responses)
+                ]
+            )
+            response_dict[
+                "message"
+            ] += f" along with {len(responses) - 1} alternative(s)"
+
+        print("\n" + response_dict["message"] + "\n")
+
+        return response_dict
+
+    def _best_pooled_solution(self, previous_solutions, min_item_difference):
+        """Best solution in the pool which satisfies all no-good cuts, or the latest solution"""
+
+        def differs_enough(solution):
+            return all(
+                sum(
+                    previous_value and not value
+                    for previous_value, value in zip(previous, solution)
+                )
+                >= min(min_item_difference, sum(map(bool, previous)))
+                for previous in previous_solutions
+            )
+
+        candidates = [
+            (objective, solution)
+            for objective, solution in self.solution_printer.solutions
+            if differs_enough(solution)
+        ]
+        if not candidates:
+            return previous_solutions[-1]
+
+        return max(candidates, key=lambda candidate: candidate[0])[1]
+
+    @staticmethod
+    def _count_changed_items(equip_dict, other_equip_dict):
+        """number of item assignments in equip_dict that aren't in other_equip_dict"""
+
+        return sum(
+            1
+            for hero_item, equipped in equip_dict.items()
+            if equipped and not other_equip_dict.get(hero_item)
+        )
+
+    def _get_candidate_classes(self, candidates_per_slot):
+        """Picks the most promising item classes for each hero, per slot (and per required set).
+        Items are scored on the stats the hero is weighted on, plus the stats with minimum constraints.
+
+        Returns:
+            Dict[int, set]: candidate item classes of each hero
+        """
+
+        hero_min_df, _, set_constraints_df = self.constraint_inputs
+
+        # constrained stats are scored by their normalisation values
+        min_constrained = (
+            hero_min_df[STAT_LIST].to_numpy()
+            > self.stat_lower_bounds[STAT_LIST].to_numpy()
+        )
+        normalisation = np.array(
+            [STAT_NORMALISATION_DICT.get(stat, 0) for stat in STAT_LIST]
+        )
+        relevance = self.stat_weights + min_constrained * normalisation
+
+        item_types = self.class_df["item_type"].to_numpy()
+
+        candidates = {}
+        for hero in self.hero_iterator:
+            scores = self.class_stat_values[hero] @ relevance[hero]
+
+            required_sets = set_constraints_df.iloc[hero][0]
+            if not isinstance(required_sets, (list, tuple)):
+                required_sets = []
+
+            masks = [item_types == item_type for item_type in ItemTypes]
+            masks += [
+                (item_types == item_type) & (self.class_set_types == set_type)
+                for item_type in ItemTypes
+                for set_type in required_sets
+            ]
+
+            candidates[hero] = set()
+            for mask in masks:
+                classes = np.flatnonzero(mask)
+                best = classes[np.argsort(-scores[classes], kind="stable")]
+                candidates[hero].update(best[:candidates_per_slot].tolist())
+
+        return candidates
+
+    @staticmethod
+    def _bucket_item_stats(item_df):
+        """Rounds item stats to the coarse resolution given by COARSE_STAT_BUCKETS"""
+
+        item_df = item_df.copy()
+        for stat, bucket_size in COARSE_STAT_BUCKETS.items():
+            item_df[stat] = (
+                np.rint(item_df[stat] / bucket_size).astype(np.int64)
+                * bucket_size
+            )
+
+        return item_df
+
+    def run_tiered_solver(self, hero_tiers_df, tolerance=0.0):
+        """Optimizes heroes tier by tier (lexicographically) instead of as a single weighted sum.
+
+        Tier 1 heroes are optimized first, their objective value is then fixed as a constraint
+        (within the relative tolerance) before moving onto tier 2 heroes, and so on. Each stage
+        is warm started from the previous solution and gets an equal share of the solver time.
+        This avoids having to use huge hero weights to stop lower priority heroes taking gear.
+        If a later stage fails, the solution of the earlier tiers is returned (FEASIBLE) rather than
+        explaining the failure as infeasible constraints.
+
+        Args:
+            hero_tiers_df (pd.DataFrame): single column of tiers per hero (lower is optimized first)
+            tolerance (float, optional): relative objective loss allowed for earlier tiers. Defaults to 0.0.
+
+        Returns:
+            Dict: response dictionary as in run_solver, including a summary of each stage
+        """
+
+        hero_tiers = [
+            int(hero_tiers_df.iloc[hero][0]) for hero in self.hero_iterator
+        ]
+        tiers = sorted(set(hero_tiers))
+
+        # share the time budget between the stages
+        total_time = self.time_limit
+        self.time_limit = total_time / len(tiers)
+
+        # the tier objectives and constraints are added to a copy so the optimizer's own model is unchanged
+        exact_model = self.model
+        self.model = cp_model.CpModel()
+        self.model.Proto().CopyFrom(exact_model.Proto())
+        solver_objective_units = self.solver_objective_units
+
+        tier_summary = []
+        stage_statuses = []
+        fallback_response = None
+
+        for tier in tiers:
+
+            tier_heroes = [
+                hero for hero in self.hero_iterator if hero_tiers[hero] == tier
+            ]
+            tier_objective = sum(
+                self.hero_objectives[hero] for hero in tier_heroes
+            )
+
+            self._maximize(tier_heroes)
+            status = self._solve()
+            stage_statuses.append(status)
+
+            tier_value = (
+                self._evaluate_objective(tier_heroes)
+                if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]
+                else None
+            )
+            tier_summary.append(
+                {
+                    "Tier": tier,
+                    "Heroes": [
+                        self.hero_base_df.index[hero] for hero in tier_heroes
+                    ],
+                    "Status": self.solver.StatusName(status),
+                    "Objective": tier_value,
+                }
+            )
+
+            if tier_value is None or tier == tiers[-1]:
+                break
+
+            # kept in case a later stage fails, the solver only holds the latest solution
+            fallback_response = self._generate_response(cp_model.FEASIBLE)
+
+            # later tiers can't reduce the objective of this tier (beyond the tolerance)
+            self.model.Add(
+                tier_objective >= tier_value - int(abs(tier_value) * tolerance)
+            )
+
+            # warm start the next stage from the current solution
+            self._set_solution_hint(
+                {
+                    var: self.solver.Value(var)
+                    for var in self.equip_vars.values()
+                }
+            )
+
+        self.model = exact_model
+        self.solver_objective_units = solver_objective_units
+        self.time_limit = total_time
+
+        # the run is only as good as its weakest stage
+        if all(status == cp_model.OPTIMAL for status in stage_statuses):
+            status = cp_model.OPTIMAL
+        elif status == cp_model.OPTIMAL:
+            status = cp_model.FEASIBLE
+
+        if fallback_response is not None and status not in [
+            cp_model.OPTIMAL,
+            cp_model.FEASIBLE,
+        ]:
+            # the user constraints were met by the earlier tiers, so the failure comes from
+            # the tier constraints (or the time share), which infeasibility can't be explained by
+            response_dict = fallback_response
+            response_dict["message"] = (
+                f"The tier {tiers[len(stage_statuses) - 1]} stage failed "
+                f"({self.solver.StatusName(status)}), the solution of the earlier tiers is shown. "
+                "Please try extending the search time or increasing the tolerance."
+            )
+        else:
+            response_dict = self._generate_response(status)
+        response_dict["tier_table"] = pd.DataFrame(tier_summary)
+
+        print("\n" + response_dict["message"] + "\n")
+
+        return response_dict
+
+    def _solve(self):
+        """Runs the solver on the current model and returns the solver status"""
+
+        early_stopping = (
+            self.early_stopping
+            if isinstance(self.solution_printer, SolutionPrinter)
+            else None
+        )
+        if early_stopping is not None:
+            self.solution_printer.early_stopping = early_stopping
+            early_stopping.start(self.solution_printer)
+
         status = self.solver.SolveWithSolutionCallback(
             self.model, self.solution_printer
         )
 
+        if early_stopping is not None:
+            early_stopping.finish()
+
+        # write out the final solution (checkpoint writes are throttled during search)
+        checkpoint = (
+            self.solution_printer.checkpoint
+            if isinstance(self.solution_printer, SolutionPool)
+            else self.solution_printer
+        )
+        if isinstance(checkpoint, CheckpointWriter) and status in [
+            cp_model.OPTIMAL,
+            cp_model.FEASIBLE,
+        ]:
+            checkpoint.flush(self.solver)
+
+        return status
+
+    def enable_checkpointing(self, path, interval=10, use_cutoff=False):
+        """Periodically saves the best solution found so far to path (see callbacks.CheckpointWriter),
+        and resumes from an existing checkpoint at that path by using it as the solution hint.
+        The path should be unique to the inputs (e.g. named after cache.hash_optimizer_inputs).
+        Call after define_solver (and set_objective_optimisation).
+
+        Args:
+            path (str): checkpoint file
+            interval (int, optional): minimum seconds between writes. Defaults to 10.
+            use_cutoff (bool, optional): only search for solutions at least as good as the checkpoint. Defaults to False.
+
+        Returns:
+            Dict: the checkpoint resumed from, or None
+        """
+
+        checkpoint = CheckpointWriter.load(path)
+
+        if checkpoint is not None:
+            self.set_solution_hint(checkpoint["equip_dict"])
+
+            if use_cutoff:
+                self.model.Add(
+                    sum(self.hero_objectives) >= checkpoint["objective_value"]
+                )
+
+        self.solution_printer = CheckpointWriter(
+            path, self._get_checkpoint, interval
+        )
+
+        return checkpoint
+
+    def _get_checkpoint(self, source):
+        """Checkpoint contents for the current solution of a solution callback or the solver"""
+
+        return {
+            "objective_value": self._evaluate_objective(value=source.Value),
+            "objective_bound": self._to_objective_units(
+                source.BestObjectiveBound()
+            ),
+            "equip_dict": self._generate_equip_dict(value=source.Value),
+            "wall_time": source.WallTime(),
+        }
+
+    def capture_model(self, path, **info):
+        """Saves the model as built so far, with its input tables and the solver parameters,
+        as a bundle that can be re-solved offline (see optimizer/replay.py).
+        Call after define_solver, e.g. to hand over a slow run.
+
+        Args:
+            path (str): bundle directory
+            **info: extra (json serialisable) info to save along, e.g. the run settings
+        """
+
+        hero_min_df, hero_max_df, set_constraints_df = self.constraint_inputs
+        stat_weightings_df, max_objective_coefficient = self.objective_inputs
+
+        save_bundle(
+            path,
+            self.model,
+            self.solver.parameters,
+            tables={
+                "item_df": self.item_df,
+                "hero_base_df": self.hero_base_df,
+                "hero_additional_df": self.hero_additional_df,
+                "pinned_item_df": self.pinned_item_df,
+                "hero_min_df": hero_min_df,
+                "hero_max_df": hero_max_df,
+                "set_constraints_df": set_constraints_df,
+                "stat_weightings_df": stat_weightings_df,
+            },
+            info={
+                "max_objective_coefficient": max_objective_coefficient,
+                **info,
+            },
+        )
+
+    def set_solution_hint(self, equip_dict):
+        """Warm starts the solver from a previous solution, e.g. a cached result.
+        Items that aren't part of the free inventory anymore are ignored.
+
+        Args:
+            equip_dict (Dict): {(hero, item): 0 or 1} as returned in the response_dict
+        """
+
+        item_classes = dict(zip(self.item_df.index, self.item_class_ids))
+
+        hint = dict.fromkeys(self.equip_vars.values(), 0)
+        for (hero, item), equipped in equip_dict.items():
+            if equipped and item in item_classes:
+                hint[self.equip_vars[(hero, item_classes[item])]] = 1
+
+        self._set_solution_hint(hint)
+
+    def _set_solution_hint(self, var_values):
+        """Replaces the solution hint of the model with the given {variable: value} mapping"""
+
+        self.model.Proto().solution_hint.Clear()
+        for var, value in var_values.items():
+            self.model.AddHint(var, value)
+
+    def _generate_response(self, status):
+        """Generates the response dictionary for the given solver status"""
+
         response_dict = {}
 
+        # a rescaled objective is only approximate, so optimal isn't guaranteed for the exact one
+        objective_rescaled = (
+            self.objective_summary is not None
+            and self.objective_summary["scale"] < 1
+        )
+        if status == cp_model.OPTIMAL and objective_rescaled:
+            status = cp_model.FEASIBLE
+
         if status == cp_model.OPTIMAL:
 
             response_dict["status"] = "OPTIMAL"
             response_dict["message"] = "Optimal solution found"
             response_dict["stats_table"] = self._generate_output_stats_table()
             response_dict["equip_dict"] = self._generate_equip_dict()
+            response_dict["objective_value"] = self._evaluate_objective()
+            response_dict["objective_summary"] = self.objective_summary
+            response_dict["objective_table"] = self._generate_objective_table()
 
         elif status == cp_model.FEASIBLE:
 
@@ -271,6 +1413,15 @@ class Optimizer:
             ] = "(potentially) Sub-optimal solution found"
             response_dict["stats_table"] = self._generate_output_stats_table()
             response_dict["equip_dict"] = self._generate_equip_dict()
+            response_dict["objective_value"] = self._evaluate_objective()
+            response_dict["objective_summary"] = self.objective_summary
+            response_dict["objective_table"] = self._generate_objective_table()
+
+            if objective_rescaled:
+                response_dict["message"] += (
+                    " for a rescaled objective (coefficients within "
+                    f"{self.objective_summary['max_relative_error']:.1%} of the exact values)"
+                )
 
         elif status == cp_model.INFEASIBLE:
 
@@ -281,6 +1432,14 @@ class Optimizer:
             response_dict["stats_table"] = None
             response_dict["equip_dict"] = None
 
+            conflict_table = self._explain_infeasibility()
+            if conflict_table is not None:
+                response_dict["message"] = (
+                    "Solution is infeasible. The constraints below can't all be met together, "
+                    "please try relaxing at least one of them."
+                )
+                response_dict["conflict_table"] = conflict_table
+
         else:
             response_dict["status"] = "UNKNOWN"
             response_dict[
@@ -290,27 +1449,170 @@ class Optimizer:
             response_dict["stats_table"] = None
             response_dict["equip_dict"] = None
 
-        print("\n" + response_dict["message"] + "\n")
+        # criterion that stopped the search before optimality, if any (see set_early_stopping)
+        response_dict["stop_reason"] = (
+            self.early_stopping.reason
+            if self.early_stopping is not None
+            else None
+        )
+        if response_dict["stop_reason"] and status == cp_model.FEASIBLE:
+            response_dict[
+                "message"
+            ] += f" (stopped early: {response_dict['stop_reason']})"
+
+        # exact parameters of the run, so it can be reproduced (see define_solver)
+        response_dict["solver_parameters"] = str(self.solver.parameters)
+        response_dict[
+            "deterministic_time"
+        ] = self.solver.ResponseProto().deterministic_time
 
         return response_dict
 
-    def _generate_equip_dict(self):
-        """After reaching a solution, generates a dictionary showing optimal hero item mappings"""
+    def _explain_infeasibility(self):
+        """Finds a small subset of the user constraints that can't be met together.
 
-        optimized_equip_dict = {}
+        Each user constraint is guarded by an assumption literal and the model is solved once more.
+        CP-SAT then reports a subset of the assumptions which is sufficient for infeasibility.
+        That subset isn't necessarily minimal, so it's shrunk further by dropping one constraint
+        at a time (within the solver time limit). Note this alters the model, so it's only run
+        once the model is known to be infeasible.
 
-        for hero_item, var in self.equip_vars.items():
+        Returns:
+            pd.DataFrame: conflicting constraints, or None if no explanation was found
+        """
+
+        if not self.user_constraints:
+            return None
+
+        assumption_literals = []
+        for ix, user_constraint in enumerate(self.user_constraints):
+            literal = self.model.NewBoolVar(f"assumption_{ix}")
+            user_constraint["constraint"].OnlyEnforceIf(literal)
+            assumption_literals.append(literal)
+
+        self.model.AddAssumptions(assumption_literals)
+
+        # assumption cores are extracted by a single worker
+        time_limit = self.time_limit
+        explanation_solver = cp_model.CpSolver()
+        explanation_solver.parameters.num_search_workers = 1
+        self._set_time_limit(explanation_solver, time_limit)
+
+        if explanation_solver.Solve(self.model) != cp_model.INFEASIBLE:
+            return None
+        used_time = self._get_solve_time(explanation_solver)
+
+        core = set(explanation_solver.SufficientAssumptionsForInfeasibility())
+        core_literals = [
+            literal
+            for literal in assumption_literals
+            if literal.Index() in core
+        ]
+
+        # keep a constraint only if the rest of the core becomes feasible without it
+        # constraints that aren't assumed are free to be switched off by the solver
+        for literal in list(core_literals):
+
+            remaining_time = time_limit - used_time
+            if remaining_time <= 0:
+                break
+
+            reduced_core = [i for i in core_literals if i is not literal]
+            self.model.Proto().ClearField("assumptions")
+            self.model.AddAssumptions(reduced_core)
+            self._set_time_limit(explanation_solver, remaining_time)
+
+            if explanation_solver.Solve(self.model) == cp_model.INFEASIBLE:
+                core_literals = reduced_core
+            used_time += self._get_solve_time(explanation_solver)
+
+        core = {literal.Index() for literal in core_literals}
+
+        conflict_table = pd.DataFrame(
+            [
+                {k: v for k, v in user_constraint.items() if k != "constraint"}
+                for user_constraint, literal in zip(
+                    self.user_constraints, assumption_literals
+                )
+                if literal.Index() in core
+            ],
+            columns=["Hero", "Constraint", "Limit"],
+        )
+
+        return conflict_table if not conflict_table.empty else None
+
+    def _generate_equip_dict(self, value=None):
+        """After reaching a solution, generates a dictionary showing optimal hero item mappings.
+        Item classes are expanded back into the concrete items they represent.
+        Items are referenced by their item_df index so that results map back onto the full
+        item list when the optimizer only sees part of the inventory.
+
+        value looks up variable values, defaults to the solver. Only the solver's solution
+        is stored as the optimized_equip_dict.
+        """
+
+        optimized_equip_dict = {
+            (hero, item): 0
+            for item in self.item_df.index
+            for hero in self.hero_iterator
+        }
+
+        # hand out the items of each class to the heroes that took one
+        for item_class, members in enumerate(self.class_members):
+            available_items = iter(self.item_df.index[members])
+            for hero in self.hero_iterator:
+                if (value or self.solver.Value)(
+                    self.equip_vars[(hero, item_class)]
+                ):
+                    optimized_equip_dict[(hero, next(available_items))] = 1
+
+        # pinned items stay on their heroes
+        for item, hero_name in self.pinned_item_df["pinned_hero"].items():
             optimized_equip_dict[
-                (hero_item[0], hero_item[1])
-            ] = self.solver.Value(var)
+                (self.hero_base_df.index.get_loc(hero_name), item)
+            ] = 1
+
+        if value is not None:
+            return optimized_equip_dict
 
         self.optimized_equip_dict = optimized_equip_dict
         return self.optimized_equip_dict
 
     def _generate_output_stats_table(self):
+        """Calculates the full stat table from the item assignment, the same way as the
+        stat expressions would, so stats that weren't modelled are included as well.
+        """
+
+        # item classes taken by each hero -> heroes x classes
+        assignment = np.array(
+            [
+                [
+                    self.solver.Value(self.equip_vars[(hero, item_class)])
+                    for item_class in self.class_iterator
+                ]
+                for hero in self.hero_iterator
+            ],
+            dtype=np.int64,
+        ).reshape(len(self.hero_iterator), len(self.class_iterator))
+
+        stats = self.hero_stat_constants + np.einsum(
+            "hc,hcs->hs", assignment, self.class_stat_values
+        )
+
+        for set_type, bonus in self.set_bonus_values.items():
+            set_counts = assignment[:, self.class_set_types == set_type].sum(
+                axis=1
+            ) + np.array(
+                [
+                    self.pinned_set_counts[hero][set_type]
+                    for hero in self.hero_iterator
+                ]
+            )
+            active_sets = set_counts // SET_TYPE_STATS[set_type]["threshold"]
+            stats += active_sets[:, None] * bonus
 
-        best_solution_df = self.hero_df_equip[STAT_LIST].applymap(
-            self.solver.Value
+        best_solution_df = pd.DataFrame(
+            stats, index=self.hero_base_df.index, columns=STAT_LIST
         )
         return best_solution_df
 
@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import pickle
+import time
+from typing import Dict, List
+
+import ortools
+import pandas as pd
+from google.protobuf import text_format
+from ortools.sat import sat_parameters_pb2
+from ortools.sat.python import cp_model
+
+from optimizer.tuning import _build_optimizer, save_instance
+
+# files of a model bundle, see save_bundle
+BUNDLE_MODEL_FILE = "model.pb"
+BUNDLE_PARAMETERS_FILE = "parameters.txt"
+BUNDLE_INSTANCE_FILE = "instance.pkl"
+BUNDLE_INFO_FILE = "info.json"
+
+
+def save_bundle(
+    path: str,
+    model: cp_model.CpModel,
+    parameters: sat_parameters_pb2.SatParameters,
+    tables: Dict[str, pd.DataFrame],
+    info: Dict = None,
+):
+    """Saves a built model as a bundle (directory), so the exact solve can be reproduced offline.
+
+    - model.pb: the CP-SAT model proto (including its solution hint)
+    - parameters.txt: the solver parameters (protobuf text format)
+    - instance.pkl: the input tables (tuning.save_instance format, can be copied into a benchmark corpus)
+    - info.json: or-tools version and any extra info
+    """
+
+    os.makedirs(path, exist_ok=True)
+
+    with open(os.path.join(path, BUNDLE_MODEL_FILE), "wb") as f:
+        f.write(model.Proto().SerializeToString())
+
+    with open(os.path.join(path, BUNDLE_PARAMETERS_FILE), "w") as f:
+        f.write(text_format.MessageToString(parameters))
+
+    save_instance(os.path.join(path, BUNDLE_INSTANCE_FILE), **tables)
+
+    with open(os.path.join(path, BUNDLE_INFO_FILE), "w") as f:
+        json.dump(
+            {
+                "ortools_version": ortools.__version__,
+                "captured_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                **(info or {}),
+            },
+            f,
+            indent=4,
+        )
+
+
+def load_bundle(path: str) -> Dict:
+    """Loads a bundle saved by save_bundle.
+
+    Returns:
+        Dict: model (cp_model.CpModel), parameters (SatParameters), tables and info
+    """
+
+    model = cp_model.CpModel()
+    with open(os.path.join(path, BUNDLE_MODEL_FILE), "rb") as f:
+        model.Proto().ParseFromString(f.read())
+
+    parameters = sat_parameters_pb2.SatParameters()
+    with open(os.path.join(path, BUNDLE_PARAMETERS_FILE)) as f:
+        text_format.Merge(f.read(), parameters)
+
+    with open(os.path.join(path, BUNDLE_INFO_FILE)) as f:
+        info = json.load(f)
+
+    with open(os.path.join(path, BUNDLE_INSTANCE_FILE), "rb") as f:
+        tables = pickle.load(f)
+
+    return {
+        "model": model,
+        "parameters": parameters,
+        "tables": tables,
+        "info": info,
+    }
+
+
+def replay_bundle(
+    path: str,
+    overrides: List[str] = None,
+    timer: float = None,
+    worker_count: int = None,
+    rebuild: bool = False,
+) -> Dict:
+    """Re-solves a bundle and returns timing stats of the solve.
+
+    Args:
+        path (str): bundle directory
+        overrides (List[str], optional): solver parameters to change, as "name: value"
+            (protobuf text format, e.g. "linearization_level: 2"). Defaults to None.
+        timer (float, optional): time limit, deterministic time if the bundle was captured with a
+            deterministic time limit and seconds otherwise. Defaults to None (as captured).
+        worker_count (int, optional): search workers. Defaults to None (as captured).
+        rebuild (bool, optional): rebuild the model from the input tables with the current code,
+            rather than solving the captured model (the solution hint and any constraints added
+            after building, e.g. a checkpoint cutoff, aren't part of the rebuilt model).
+            Use this to compare model building changes. Defaults to False.
+
+    Returns:
+        Dict: status, objective and timing stats of the solve
+    """
+
+    bundle = load_bundle(path)
+    model = bundle["model"]
+
+    if rebuild:
+        opt = _build_optimizer(
+            bundle["tables"],
+            max_objective_coefficient=bundle["info"].get(
+                "max_objective_coefficient"
+            ),
+        )
+        model = opt.model
+
+    solver = cp_model.CpSolver()
+    solver.parameters.CopyFrom(bundle["parameters"])
+    for override in overrides or []:
+        text_format.Merge(override, solver.parameters)
+    if timer is not None:
+        # override whichever limit the captured solve used (see Optimizer.time_limit)
+        if solver.parameters.HasField("max_deterministic_time"):
+            solver.parameters.max_deterministic_time = timer
+        else:
+            solver.parameters.max_time_in_seconds = timer
+    if worker_count is not None:
+        solver.parameters.num_search_workers = worker_count
+
+    status = solver.Solve(model)
+
+    return {
+        "Bundle": os.path.basename(os.path.normpath(path)),
+        "Model": "rebuilt" if rebuild else "captured",
+        "Status": solver.StatusName(status),
+        # objective of the solver model (compacted, see objective.compact_objective)
+        "Objective": solver.ObjectiveValue()
+        if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]
+        else None,
+        "Bound": solver.BestObjectiveBound(),
+        "Wall_Time": solver.WallTime(),
+        "Deterministic_Time": solver.ResponseProto().deterministic_time,
+        "Branches": solver.NumBranches(),
+        "Conflicts": solver.NumConflicts(),
+        "Captured_Version": bundle["info"].get("ortools_version"),
+        "Version": ortools.__version__,
+    }
+
+
+if __name__ == "__main__":
+
+    # run as a module from e7_optimizer/, so the optimizer package can be imported
+    parser = argparse.ArgumentParser(
+        prog="python -m optimizer.replay",
+        description="Re-solves captured model bundles and prints timing stats.",
+    )
+    parser.add_argument("bundles", nargs="+", help="bundle directories")
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        dest="overrides",
+        help='solver parameter override, e.g. --set "linearization_level: 2"',
+    )
+    parser.add_argument(
+        "--timer",
+        type=float,
+        default=None,
+        help="time limit, deterministic time for deterministic captures",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="rebuild the models from the input tables with the current code",
+    )
+    args = parser.parse_args()
+
+    replay_results = pd.DataFrame(
+        [
+            replay_bundle(
+                bundle,
+                overrides=args.overrides,
+                timer=args.timer,
+                worker_count=args.workers,
+                rebuild=args.rebuild,
+            )
+            for bundle in args.bundles
+        ]
+    )
+
+    with pd.option_context("display.width", None):
+        print(replay_results.to_string(index=False))
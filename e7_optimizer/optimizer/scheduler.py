@@ -0,0 +1,134 @@
+import itertools
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+class SolveJob:
+    """A solve request waiting for, or holding, solver workers"""
+
+    def __init__(self, job_id: int, requested_workers: int):
+        self.job_id = job_id
+        self.requested_workers = requested_workers
+        self.workers = 0  # allocated once the job is admitted
+
+    @property
+    def admitted(self) -> bool:
+        return self.workers > 0
+
+
+class SolveScheduler:
+    """
+    Process wide admission control for solver runs, shared by all sessions.
+
+    The total number of search workers across running solves is capped by a global budget.
+    Jobs are admitted strictly first come first served, each getting a fair share of the budget
+    (budget / number of running and waiting jobs) capped by the number of workers it asked for.
+    A job waits at the head of the queue until its share is free, so the CPU is never
+    oversubscribed and a solve runs for its time limit once admitted.
+    """
+
+    def __init__(self, worker_budget: int = None):
+        self.worker_budget = worker_budget or os.cpu_count() or 1
+        self._free_workers = self.worker_budget
+        self._running = 0
+        self._queue: deque = deque()
+        self._job_ids = itertools.count()
+        self._condition = threading.Condition()
+
+    def submit(self, requested_workers: int) -> SolveJob:
+        """Adds a job to the back of the queue"""
+
+        requested_workers = max(1, min(requested_workers, self.worker_budget))
+
+        with self._condition:
+            job = SolveJob(next(self._job_ids), requested_workers)
+            self._queue.append(job)
+            self._admit()
+
+        return job
+
+    def _fair_share(self, job: SolveJob) -> int:
+
+        active_jobs = self._running + len(self._queue)
+        return max(
+            1, min(job.requested_workers, self.worker_budget // active_jobs)
+        )
+
+    def _admit(self):
+        """Admits jobs from the head of the queue while their share of the workers is free"""
+
+        while self._queue:
+            job = self._queue[0]
+            workers = self._fair_share(job)
+            if workers > self._free_workers:
+                break
+
+            self._queue.popleft()
+            job.workers = workers
+            self._free_workers -= workers
+            self._running += 1
+
+        self._condition.notify_all()
+
+    def wait(self, job: SolveJob, timeout: float = None) -> bool:
+        """Blocks until the job is admitted or the timeout passes, returns whether it was admitted"""
+
+        with self._condition:
+            return self._condition.wait_for(lambda: job.admitted, timeout)
+
+    def queue_position(self, job: SolveJob) -> int:
+        """1 based position of a waiting job, 0 once it's running"""
+
+        with self._condition:
+            if job.admitted:
+                return 0
+            return self._queue.index(job) + 1
+
+    def release(self, job: SolveJob):
+        """Frees the workers of a finished job, or withdraws a job that's still waiting"""
+
+        with self._condition:
+            if job.admitted:
+                self._free_workers += job.workers
+                self._running -= 1
+                job.workers = 0
+            elif job in self._queue:
+                self._queue.remove(job)
+
+            self._admit()
+
+    def status(self) -> dict:
+        with self._condition:
+            return {
+                "worker_budget": self.worker_budget,
+                "free_workers": self._free_workers,
+                "running_jobs": self._running,
+                "queued_jobs": len(self._queue),
+            }
+
+    @contextmanager
+    def reserve(
+        self,
+        requested_workers: int,
+        on_wait: Optional[Callable[[int], None]] = None,
+        poll_interval: float = 0.5,
+    ):
+        """Waits for a slot and yields the number of workers the solve may use.
+        on_wait is called with the queue position while waiting (e.g. to update the UI).
+
+        with scheduler.reserve(8) as worker_count:
+            opt.define_solver(timer=60, worker_count=worker_count)
+            ...
+        """
+
+        job = self.submit(requested_workers)
+        try:
+            while not self.wait(job, poll_interval):
+                if on_wait:
+                    on_wait(self.queue_position(job))
+            yield job.workers
+        finally:
+            self.release(job)
@@ -0,0 +1,253 @@
+import argparse
+import glob
+import json
+import os
+import pickle
+import time
+from typing import Dict
+
+import pandas as pd
+from ortools.sat.python import cp_model
+
+from optimizer.data_structures import SOLVER_PROFILE_PATH
+
+# parameter configurations tried by the tuning harness, {name: {CP-SAT parameter: value}}
+PARAMETER_CANDIDATES = {
+    "default": {},
+    "linearization_0": {"linearization_level": 0},
+    "linearization_2": {"linearization_level": 2},
+    "no_symmetry": {"symmetry_level": 0},
+    "symmetry_2": {"symmetry_level": 2},
+    "fixed_search": {"search_branching": cp_model.FIXED_SEARCH},
+    "portfolio_search": {"search_branching": cp_model.PORTFOLIO_SEARCH},
+    "light_presolve": {
+        "max_presolve_iterations": 1,
+        "cp_model_probing_level": 0,
+    },
+    "no_presolve": {"cp_model_presolve": False},
+}
+
+# problem size classes by number of equip variables (heroes x item classes), upper limits
+SIZE_CLASSES = {
+    "small": 2000,
+    "medium": 10000,
+    "large": float("inf"),
+}
+
+# tables an instance is made of, as taken by the Optimizer and its setup methods
+INSTANCE_TABLES = [
+    "item_df",
+    "hero_base_df",
+    "hero_additional_df",
+    "pinned_item_df",
+    "hero_min_df",
+    "hero_max_df",
+    "set_constraints_df",
+    "stat_weightings_df",
+]
+
+
+def get_size_class(n_variables: int) -> str:
+    """Size class of a model with the given number of equip variables"""
+
+    for size_class, limit in SIZE_CLASSES.items():
+        if n_variables < limit:
+            return size_class
+
+
+def load_profile(n_variables: int, path: str = SOLVER_PROFILE_PATH) -> Dict:
+    """Returns the tuned solver parameters for the size class of a model, or {} if there
+    is no profile file (or no profile for that size class).
+    """
+
+    if not path or not os.path.isfile(path):
+        return {}
+
+    with open(path) as f:
+        profiles = json.load(f)
+
+    return profiles.get(get_size_class(n_variables), {}).get("parameters", {})
+
+
+def save_instance(path: str, **tables: pd.DataFrame):
+    """Saves the input tables of an optimization (see INSTANCE_TABLES) to the benchmark corpus"""
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, "wb") as f:
+        pickle.dump({name: tables.get(name) for name in INSTANCE_TABLES}, f)
+
+
+def load_corpus(corpus_dir: str) -> Dict[str, Dict]:
+    """Loads every instance (*.pkl) in the benchmark corpus, {instance name: tables}"""
+
+    corpus = {}
+    for path in sorted(glob.glob(os.path.join(corpus_dir, "*.pkl"))):
+        with open(path, "rb") as f:
+            corpus[os.path.splitext(os.path.basename(path))[0]] = pickle.load(f)
+
+    return corpus
+
+
+def _build_optimizer(tables: Dict, max_objective_coefficient: int = None):
+    # imported here as the optimizer loads its profiles from this module
+    from optimizer.optimizer import Optimizer
+
+    opt = Optimizer(
+        item_df=tables["item_df"],
+        hero_base_df=tables["hero_base_df"],
+        hero_additional_df=tables["hero_additional_df"],
+        pinned_item_df=tables.get("pinned_item_df"),
+    )
+    opt.add_constraints(
+        hero_min_df=tables["hero_min_df"],
+        hero_max_df=tables["hero_max_df"],
+        set_constraints_df=tables["set_constraints_df"],
+    )
+    opt.set_objective_optimisation(
+        stat_weightings_df=tables["stat_weightings_df"],
+        max_objective_coefficient=max_objective_coefficient,
+    )
+
+    return opt
+
+
+def run_tuning(
+    corpus: Dict[str, Dict],
+    configs: Dict[str, Dict] = None,
+    timer: float = 30,
+    worker_count: int = None,
+    deterministic: bool = False,
+) -> pd.DataFrame:
+    """Solves every instance of the corpus with every parameter configuration.
+
+    Args:
+        corpus (Dict[str, Dict]): {instance name: tables} (see load_corpus)
+        configs (Dict[str, Dict], optional): configurations to try. Defaults to PARAMETER_CANDIDATES.
+        timer (float, optional): time limit per solve in seconds. Defaults to 30.
+        worker_count (int, optional): search workers. Defaults to None (number of cpu cores).
+        deterministic (bool, optional): solve in deterministic mode (see Optimizer.define_solver),
+            so runs are comparable across machines and repeat runs. Defaults to False.
+
+    Returns:
+        pd.DataFrame: one row per instance and configuration
+    """
+
+    configs = PARAMETER_CANDIDATES if configs is None else configs
+
+    results = []
+    for instance, tables in corpus.items():
+        for config_name, parameters in configs.items():
+
+            # the model is rebuilt for each run so no state carries over between configurations
+            opt = _build_optimizer(tables)
+            opt.define_solver(
+                timer=timer,
+                worker_count=worker_count,
+                profile_path=None,
+                deterministic=deterministic,
+            )
+            for name, value in parameters.items():
+                setattr(opt.solver.parameters, name, value)
+            opt.solution_printer = None
+
+            start_time = time.time()
+            status = opt.solver.Solve(opt.model)
+            solve_time = time.time() - start_time
+
+            results.append(
+                {
+                    "Instance": instance,
+                    "Size_Class": get_size_class(len(opt.equip_vars)),
+                    "Config": config_name,
+                    "Status": opt.solver.StatusName(status),
+                    "Time": solve_time,
+                    "Deterministic_Time": opt.solver.ResponseProto().deterministic_time,
+                    "Objective": opt.solver.ObjectiveValue()
+                    if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]
+                    else None,
+                }
+            )
+            print(results[-1])
+
+    return pd.DataFrame(results)
+
+
+def select_profiles(
+    results: pd.DataFrame,
+    configs: Dict[str, Dict] = None,
+    timer: float = 30,
+    time_column: str = "Time",
+) -> Dict:
+    """Picks the best configuration per size class.
+
+    Configurations are ranked by their mean time to optimal, where runs that didn't reach
+    optimality count as twice the time limit (PAR2 score). Runs are timed by time_column,
+    Deterministic_Time for deterministic runs.
+
+    Returns:
+        Dict: {size_class: {"config", "parameters", "score"}}
+    """
+
+    configs = PARAMETER_CANDIDATES if configs is None else configs
+
+    results = results.assign(
+        Score=results[time_column].where(
+            results["Status"] == "OPTIMAL", 2 * timer
+        )
+    )
+    scores = results.groupby(["Size_Class", "Config"])["Score"].mean()
+
+    profiles = {}
+    for size_class, class_scores in scores.groupby(level="Size_Class"):
+        best_config = class_scores.idxmin()[1]
+        profiles[size_class] = {
+            "config": best_config,
+            "parameters": configs[best_config],
+            "score": float(class_scores.min()),
+        }
+
+    return profiles
+
+
+def save_profiles(profiles: Dict, path: str = SOLVER_PROFILE_PATH):
+    """Saves the profiles where define_solver picks them up"""
+
+    with open(path, "w") as f:
+        json.dump(profiles, f, indent=4)
+
+
+if __name__ == "__main__":
+
+    # run as a module from e7_optimizer/, so the optimizer package can be imported
+    parser = argparse.ArgumentParser(
+        prog="python -m optimizer.tuning",
+        description="Tunes the solver parameters on a corpus of saved optimizer instances.",
+    )
+    parser.add_argument("corpus_dir", help="directory of saved instances")
+    parser.add_argument("--timer", type=float, default=30)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=SOLVER_PROFILE_PATH)
+    parser.add_argument(
+        "--deterministic",
+        action="store_true",
+        help="score configurations by deterministic time instead of wall time",
+    )
+    args = parser.parse_args()
+
+    tuning_results = run_tuning(
+        load_corpus(args.corpus_dir),
+        timer=args.timer,
+        worker_count=args.workers,
+        deterministic=args.deterministic,
+    )
+    solver_profiles = select_profiles(
+        tuning_results,
+        timer=args.timer,
+        time_column="Deterministic_Time" if args.deterministic else "Time",
+    )
+    save_profiles(solver_profiles, args.output)
+
+    print(solver_profiles)
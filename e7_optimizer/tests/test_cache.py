@@ -0,0 +1,16 @@
+from optimizer.cache import ResultCache
+
+
+def test_cached_results_are_copies(tmp_path):
+    response_dict = {"status": "OPTIMAL", "equip_dict": {(0, 100): 1}}
+
+    for cache_dir in [None, str(tmp_path)]:
+        cache = ResultCache(cache_dir=cache_dir)
+        cache.put("key", response_dict, solver_time=1.0)
+
+        # changing the stored result or a hit doesn't change the cache
+        response_dict["equip_dict"][(0, 100)] = 0
+        cache.get("key")["response_dict"]["equip_dict"] = None
+
+        assert cache.get("key")["response_dict"]["equip_dict"] == {(0, 100): 1}
+        response_dict["equip_dict"][(0, 100)] = 1
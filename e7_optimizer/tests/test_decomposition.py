@@ -0,0 +1,53 @@
+import pandas as pd
+
+from optimizer.data_handlers import to_int_table
+from optimizer.data_structures import STAT_LIST, ItemTypes, SetTypes
+from optimizer.decomposition import get_hero_demand, split_item_budgets
+
+
+def _stat_table(index, **stats):
+    return pd.DataFrame(
+        [{stat: stats.get(stat, 0) for stat in STAT_LIST} for _ in index],
+        index=index,
+    )
+
+
+def test_split_item_budgets_drafts_required_sets_first():
+    # per slot, three attack items that are better than the single speed item
+    rows = []
+    for item_type in ItemTypes:
+        for attack, set_type in [
+            (30, SetTypes.ATTACK),
+            (20, SetTypes.ATTACK),
+            (10, SetTypes.ATTACK),
+            (5, SetTypes.SPEED),
+        ]:
+            rows.append(
+                {
+                    "item_type": item_type,
+                    "set_type": set_type,
+                    **{stat: 0 for stat in STAT_LIST},
+                    "Attack": attack,
+                }
+            )
+    item_df = to_int_table(pd.DataFrame(rows))
+
+    heroes = ["A", "B"]
+    hero_base_df = _stat_table(heroes, Attack=1000)
+    demand_df = get_hero_demand(
+        hero_additional_df=hero_base_df,
+        hero_min_df=_stat_table(heroes),
+        set_constraints_df=pd.DataFrame(
+            {"set_type_constraint": [[SetTypes.SPEED], None]}, index=heroes
+        ),
+        stat_weightings_df=_stat_table(heroes, Attack=1),
+    )
+
+    budgets = split_item_budgets(
+        item_df, hero_base_df, demand_df, clusters=[[0], [1]]
+    )
+
+    # hero A needs the speed set, so their cluster gets every speed item
+    speed_items = item_df.index[item_df["set_type"] == SetTypes.SPEED]
+    assert set(speed_items) <= set(budgets[0])
+    assert set(speed_items).isdisjoint(budgets[1])
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+from optimizer.data_handlers import to_int_table
+from optimizer.data_structures import (
+    PERCENT_STAT_MAP,
+    STAT_LIST,
+    ItemTypes,
+    SetTypes,
+    StatStick,
+)
+from optimizer.evaluator import (
+    check_hero_parity,
+    evaluate_builds,
+    evaluate_heroes,
+)
+from optimizer.optimizer import Optimizer
+from optimizer.utils import Hero, Item
+
+
+def _random_stats(rng, high, integer=True):
+    values = rng.integers(0, high, len(STAT_LIST))
+    if not integer:
+        values = values + rng.random(len(STAT_LIST))
+    return StatStick(*values.tolist())
+
+
+def _random_hero(rng, name):
+    hero = Hero(
+        name=name,
+        base_stats=_random_stats(rng, 5000),
+        additional_stats=_random_stats(rng, 100, integer=False),
+        artifact=_random_stats(rng, 100, integer=False),
+    )
+
+    # a random set of items, with some slots left empty
+    for item_type in ItemTypes:
+        if rng.random() < 0.2:
+            continue
+        hero.equip_item(
+            Item(
+                name=f"{name}_{item_type.name}",
+                item_type=item_type,
+                set_type=SetTypes(rng.integers(1, len(SetTypes) + 1)),
+                stats=_random_stats(rng, 100),
+            )
+        )
+
+    return hero
+
+
+def test_heroes_match_update_stats_bit_for_bit():
+    rng = np.random.default_rng(0)
+    heroes = [_random_hero(rng, f"hero_{i}") for i in range(500)]
+
+    assert len(check_hero_parity(heroes)) == 0
+
+    stats, _ = evaluate_heroes(heroes)
+    assert stats.shape == (len(heroes), len(STAT_LIST))
+
+
+def test_optimizer_stats_table_within_rounding():
+    rng = np.random.default_rng(0)
+    heroes = ["A", "B"]
+
+    item_df = to_int_table(
+        pd.DataFrame(
+            [
+                {
+                    "item_type": item_type,
+                    "set_type": SetTypes(rng.integers(1, len(SetTypes) + 1)),
+                    **_random_stats(rng, 100).__dict__,
+                }
+                for item_type in ItemTypes
+                for _ in range(3)
+            ]
+        )
+    )
+    # heroes have no base percentage stats (see generate_hero_objects_from_df)
+    hero_base_df = to_int_table(
+        pd.DataFrame(
+            [_random_stats(rng, 5000).__dict__ for _ in heroes], index=heroes
+        ).assign(**dict.fromkeys(PERCENT_STAT_MAP, 0))
+    )
+    zero_df = pd.DataFrame(0, index=heroes, columns=STAT_LIST)
+
+    opt = Optimizer(
+        item_df=item_df,
+        hero_base_df=hero_base_df,
+        hero_additional_df=hero_base_df,
+    )
+    opt.add_constraints(
+        hero_min_df=zero_df,
+        hero_max_df=zero_df + 10 ** 6,
+        set_constraints_df=pd.DataFrame(
+            {"set_type_constraint": [None, None]}, index=heroes
+        ),
+    )
+    opt.set_objective_optimisation(zero_df.assign(Attack=1))
+    opt.define_solver(timer=5, worker_count=1, profile_path=None)
+    response_dict = opt.run_solver()
+
+    build_items = np.full((len(heroes), len(ItemTypes)), -1)
+    for (hero, item), equipped in response_dict["equip_dict"].items():
+        if equipped:
+            slot = list(ItemTypes).index(item_df.loc[item, "item_type"])
+            build_items[hero, slot] = item_df.index.get_loc(item)
+
+    stats, _ = evaluate_builds(
+        build_items,
+        item_df[STAT_LIST].to_numpy(dtype=float),
+        item_df["set_type"].to_numpy(dtype=int),
+        base_stats=hero_base_df[STAT_LIST].to_numpy(),
+        base_with_additional_stats=hero_base_df[STAT_LIST].to_numpy(),
+    )
+
+    # the optimizer rounds the percentage stats down per item and set bonus
+    difference = stats - response_dict["stats_table"].to_numpy()
+    assert (difference >= 0).all()
+    assert (difference < len(ItemTypes) + len(ItemTypes) // 2).all()
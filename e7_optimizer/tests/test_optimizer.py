@@ -0,0 +1,157 @@
+import pandas as pd
+import pytest
+from ortools.sat.python import cp_model
+
+from optimizer.data_handlers import to_int_table
+from optimizer.data_structures import STAT_LIST, ItemTypes, SetTypes
+from optimizer.callbacks import CheckpointWriter
+from optimizer.optimizer import Optimizer
+
+HEROES = ["A", "B"]
+
+
+def _stat_table(index, **stats):
+    return pd.DataFrame(
+        [{stat: stats.get(stat, 0) for stat in STAT_LIST} for _ in index],
+        index=index,
+    )
+
+
+def _item_df(n_per_slot=2):
+    rows = [
+        {
+            "item_type": item_type,
+            "set_type": SetTypes.SPEED,
+            **{stat: 0 for stat in STAT_LIST},
+            "Attack": 10 * (copy + 1),
+        }
+        for item_type in ItemTypes
+        for copy in range(n_per_slot)
+    ]
+    return to_int_table(pd.DataFrame(rows, index=range(100, 100 + len(rows))))
+
+
+def _optimizer(item_df, pinned_item_df=None):
+    hero_base_df = to_int_table(_stat_table(HEROES, Attack=1000))
+    return Optimizer(
+        item_df=item_df,
+        hero_base_df=hero_base_df,
+        hero_additional_df=hero_base_df,
+        pinned_item_df=pinned_item_df,
+    )
+
+
+def test_two_items_pinned_to_one_slot_raise():
+    item_df = _item_df()
+    weapons = item_df[item_df["item_type"] == ItemTypes.WEAPON]
+    pinned_item_df = weapons.assign(pinned_hero="A")
+
+    with pytest.raises(ValueError):
+        _optimizer(item_df.drop(weapons.index), pinned_item_df)
+
+
+def _add_constraints_and_objective(opt):
+    opt.add_constraints(
+        hero_min_df=_stat_table(HEROES),
+        hero_max_df=_stat_table(
+            HEROES, **{stat: 10 ** 6 for stat in STAT_LIST}
+        ),
+        set_constraints_df=pd.DataFrame(
+            {"set_type_constraint": [None, None]}, index=HEROES
+        ),
+    )
+    opt.set_objective_optimisation(_stat_table(HEROES, Attack=1))
+    opt.define_solver(timer=5, worker_count=1, profile_path=None)
+
+
+def test_alternatives_with_fewer_items_than_the_required_difference():
+    item_df = _item_df()
+    opt = _optimizer(item_df[item_df["item_type"] == ItemTypes.WEAPON].iloc[:1])
+    _add_constraints_and_objective(opt)
+
+    # the single item moves to the other hero, then is left unused,
+    # even though 2 changes are asked for
+    response_dict = opt.run_solver(n_solutions=3, min_item_difference=2)
+    assert len(response_dict["alternatives"]) == 2
+    assert not any(response_dict["alternatives"][-1]["equip_dict"].values())
+
+    objectives = response_dict["alternatives_table"]["Objective"]
+    assert objectives.is_monotonic_decreasing
+
+
+def test_no_free_items():
+    item_df = _item_df()
+    pinned_item_df = item_df.iloc[::2].assign(pinned_hero="A")
+
+    opt = _optimizer(item_df.iloc[:0], pinned_item_df)
+    _add_constraints_and_objective(opt)
+
+    assert len(opt.class_df) == 0
+    assert len(opt.item_class_ids) == 0
+
+    response_dict = opt.run_solver()
+    assert response_dict["status"] == "OPTIMAL"
+    # base attack plus the pinned items (attack 10 each), the speed set adds no attack
+    assert response_dict["objective_value"] == 2 * 1000 + 6 * 10
+
+
+def test_failed_later_tier_returns_the_earlier_tiers_solution(monkeypatch):
+    opt = _optimizer(_item_df())
+    _add_constraints_and_objective(opt)
+    model_proto = str(opt.model.Proto())
+
+    # the second (tier) stage fails
+    statuses = iter([cp_model.OPTIMAL, cp_model.INFEASIBLE])
+    solve = opt._solve
+
+    def failing_solve():
+        solve()
+        return next(statuses)
+
+    monkeypatch.setattr(opt, "_solve", failing_solve)
+    monkeypatch.setattr(opt, "_explain_infeasibility", pytest.fail)
+
+    response_dict = opt.run_tiered_solver(
+        pd.DataFrame({"tier": [1, 2]}, index=HEROES)
+    )
+    assert response_dict["status"] == "FEASIBLE"
+    assert "tier 2" in response_dict["message"]
+    # tier 1 hero A gets the best item of every slot
+    assert response_dict["stats_table"].loc["A", "Attack"] == 1000 + 6 * 20
+    assert list(response_dict["tier_table"]["Status"]) == [
+        "OPTIMAL",
+        "INFEASIBLE",
+    ]
+
+    # the tier stages leave the optimizer as it was
+    assert opt.time_limit == 5
+    assert str(opt.model.Proto()) == model_proto
+
+    monkeypatch.undo()
+    assert opt.run_solver()["objective_value"] == 2 * 1000 + 6 * (10 + 20)
+
+
+def test_alternatives_keep_checkpointing(tmp_path):
+    opt = _optimizer(_item_df())
+    _add_constraints_and_objective(opt)
+    checkpoint_path = str(tmp_path / "checkpoint.pkl")
+    opt.enable_checkpointing(checkpoint_path)
+    checkpoint_writer = opt.solution_printer
+
+    response_dict = opt.run_solver(n_solutions=2)
+    assert len(response_dict["alternatives"]) == 1
+
+    # the checkpoint holds the solution of the first (best) search
+    checkpoint = CheckpointWriter.load(checkpoint_path)
+    assert checkpoint["equip_dict"] == response_dict["equip_dict"]
+    assert opt.solution_printer is checkpoint_writer
+
+
+def test_alternatives_stop_early():
+    opt = _optimizer(_item_df())
+    _add_constraints_and_objective(opt)
+    opt.set_early_stopping(absolute_gap=10 ** 9)
+
+    response_dict = opt.run_solver(n_solutions=2)
+    assert response_dict["stop_reason"] is not None
+    assert response_dict["alternatives"][0]["stop_reason"] is not None